@@ -0,0 +1,155 @@
+"""
+API Response Cache
+Persistent SQLite cache for HikerAPI responses, keyed by endpoint and arguments
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import tracing
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of JSON responses
+    
+    Entries expire after a per-endpoint TTL (seconds, None = never). TTLs can be
+    set separately for the first page of paginated endpoints ("<endpoint>:first_page"),
+    which changes as new items arrive, while older pages are stable.
+    When the database grows beyond max_bytes, least recently used entries are evicted.
+    """
+    
+    def __init__(self, path, ttls=None, default_ttl=None, max_bytes=None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        
+        self.hits = 0
+        self.misses = 0
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                endpoint TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    
+    @staticmethod
+    def make_key(endpoint, args, kwargs):
+        """Stable key for an endpoint call"""
+        return json.dumps([endpoint, list(args), kwargs], sort_keys=True, default=str)
+    
+    def ttl_for(self, endpoint):
+        if endpoint in self.ttls:
+            return self.ttls[endpoint]
+        return self.ttls.get(endpoint.split(':')[0], self.default_ttl)
+    
+    def get(self, endpoint, key):
+        """Return (found, value)"""
+        now = time.time()
+        ttl = self.ttl_for(endpoint)
+        
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            
+            if row is None or (ttl is not None and now - row[1] > ttl):
+                self.misses += 1
+                return False, None
+            
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        
+        return True, json.loads(row[0])
+    
+    def set(self, endpoint, key, value):
+        """Store a response (silently skipped if it is not JSON serializable)"""
+        try:
+            data = json.dumps(value)
+        except (TypeError, ValueError):
+            return
+        
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, endpoint, data, len(data), now, now)
+            )
+            self._size += len(data) - (old[0] if old else 0)
+            self._evict()
+            self._conn.commit()
+    
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes"""
+        if not self.max_bytes or self._size <= self.max_bytes:
+            return
+        
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall()
+        for key, size in rows:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._size -= size
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedClient:
+    """
+    Wrap a HikerAPI client so cacheable endpoint calls are served from the cache
+    uncached is the wrapped client, for calls that need a fresh answer
+    """
+    
+    def __init__(self, client, cache, endpoints):
+        self._client = client
+        self.cache = cache
+        self.endpoints = set(endpoints)
+    
+    @property
+    def uncached(self):
+        return self._client
+    
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name not in self.endpoints or not callable(attr):
+            return attr
+        
+        def call(*args, **kwargs):
+            endpoint = name
+            if 'end_cursor' in kwargs and not kwargs['end_cursor']:
+                endpoint = f"{name}:first_page"
+            
+            key = self.cache.make_key(name, args, kwargs)
+            found, value = self.cache.get(endpoint, key)
+            if found:
+                tracing.instant(f"cache hit {name}", "cache")
+                return value
+            
+            value = attr(*args, **kwargs)
+            
+            # Do not pin empty answers or API error payloads
+            if value and not (isinstance(value, dict) and 'exc_type' in value):
+                self.cache.set(endpoint, key, value)
+            return value
+        
+        return call
@@ -0,0 +1,128 @@
+"""
+API Error Classification
+Map HikerAPI errors to a small set of error classes shared by the scraper modules
+"""
+
+# Error classes
+AUTH = "auth"
+FORBIDDEN = "forbidden"
+RATE_LIMIT = "rate_limit"
+NOT_FOUND = "not_found"
+TRANSIENT = "transient"
+OTHER = "other"
+
+# Server errors and network failures worth retrying
+_TRANSIENT_MARKERS = ("500", "502", "503", "504", "timed out", "timeout", "connection", "temporarily unavailable",
+                      "service unavailable", "bad gateway", "internal server error")
+_TRANSIENT_TYPES = (ConnectionError, TimeoutError)
+
+# HTTP status -> error class (other 5xx are transient)
+_STATUS_CLASSES = {401: AUTH, 403: FORBIDDEN, 404: NOT_FOUND, 429: RATE_LIMIT}
+
+# Keys of an error answer: {'detail': ..., 'exc_type': ...}
+_ERROR_PAYLOAD_KEYS = {'detail', 'exc_type', 'state', 'status', 'status_code'}
+
+# Endpoints hikerapi.Client has no method for: name -> (HTTP method, path), called through its _request
+RAW_ENDPOINTS = {
+    'media_likers_chunk_gql': ("GET", "/gql/media/likers/chunk"),
+}
+
+
+def client_method(client, name):
+    """Method `name` of a HikerAPI client; RAW_ENDPOINTS it lacks are sent through its _request"""
+    attr = getattr(client, name, None)
+    if attr is None and name in RAW_ENDPOINTS:
+        method, path = RAW_ENDPOINTS[name]
+        return lambda **params: client._request(method, path, params=params)
+    if attr is None:
+        raise AttributeError(name)
+    return attr
+
+
+class APIError(Exception):
+    """
+    Error answer of the API
+    hikerapi returns error answers (an exc_type/detail dict, or a non-JSON body)
+    instead of raising, so CheckedClient raises this with the HTTP status
+    """
+    
+    def __init__(self, status, message):
+        super().__init__(f"{status} {message}" if status else message)
+        self.status = status
+
+
+def classify_error(error):
+    """
+    Classify an exception (or error message) from the API
+    Returns one of AUTH, FORBIDDEN, RATE_LIMIT, NOT_FOUND, TRANSIENT, OTHER
+    """
+    error_msg = str(error)
+    error_type = type(error).__name__
+    status = getattr(error, 'status', None)
+    
+    if isinstance(status, int) and status >= 400:
+        return _STATUS_CLASSES.get(status, TRANSIENT if status >= 500 else OTHER)
+    elif "401" in error_msg or "Unauthorized" in error_msg or "authentication" in error_msg.lower():
+        return AUTH
+    elif "403" in error_msg or "Forbidden" in error_msg:
+        return FORBIDDEN
+    elif "429" in error_msg or "rate limit" in error_msg.lower() or "too many requests" in error_msg.lower():
+        return RATE_LIMIT
+    elif "404" in error_msg or "not found" in error_msg.lower():
+        return NOT_FOUND
+    elif (isinstance(error, _TRANSIENT_TYPES) or "Timeout" in error_type or "Connect" in error_type
+          or any(marker in error_msg.lower() for marker in _TRANSIENT_MARKERS)):
+        # httpx errors (ReadTimeout, ConnectError, ...) are matched by name
+        return TRANSIENT
+    else:
+        return OTHER
+
+
+def error_payload(result, status=None):
+    """
+    APIError for an error answer of the API, None for a normal result
+    status is the HTTP status of the response when known
+    """
+    if isinstance(result, (bytes, bytearray)):
+        # Not JSON: an HTML error page from a proxy, or an empty body
+        text = bytes(result[:200]).decode('utf-8', 'replace').strip()
+        return APIError(status, f"non-JSON response: {text or '(empty)'}")
+    
+    if isinstance(result, dict) and ('exc_type' in result or ('detail' in result and set(result) <= _ERROR_PAYLOAD_KEYS)):
+        status = status or result.get('status_code') or result.get('status')
+        exc_type = result.get('exc_type') or "Error"
+        return APIError(status if isinstance(status, int) else None, f"{exc_type}: {result.get('detail', '')}")
+    
+    if status and status >= 400:
+        return APIError(status, str(result)[:200])
+    return None
+
+
+class CheckedClient:
+    """
+    Wrap a HikerAPI client so every error answer raises APIError
+    
+    Sits directly on the hikerapi (or fake) client, below rate limiting, retries
+    and the token pool, so they all see the real 401/403/429/5xx errors.
+    status() returns the HTTP status of the calling thread's last response
+    (None when unknown). RAW_ENDPOINTS missing from the client are sent
+    through its _request.
+    """
+    
+    def __init__(self, client, status=None):
+        self._client = client
+        self._status = status or (lambda: None)
+    
+    def __getattr__(self, name):
+        attr = client_method(self._client, name)
+        if not callable(attr):
+            return attr
+        
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            error = error_payload(result, self._status())
+            if error is not None:
+                raise error
+            return result
+        
+        return call
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Scraper Benchmark
+Run the full scraper.main() pipeline offline against the fake HikerAPI and report
+posts/hour, API calls per post and peak memory (RSS)
+
+The "assembly" mode is a micro-benchmark of the CSV output assembly: the original
+pandas save_results, the previous one-dict-per-row writer and the current
+column-oriented StreamingCSVWriter
+"""
+
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import config
+from config import print_header, print_info, print_error
+from fake_hikerapi import FakeClient, ReplayClient, RecordingClient
+from records import CommentBuffer, LikerBuffer
+from writers import OUTPUT_COLUMNS, StreamingCSVWriter
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Benchmark scraper.main() without spending API credits")
+    parser.add_argument('mode', nargs='?', default='fake', choices=['fake', 'replay', 'record', 'assembly'],
+                        help="fake: synthetic posts, replay: serve recorded fixtures, "
+                             "record: scrape with the real API and save fixtures, "
+                             "assembly: micro-benchmark of the CSV output assembly")
+    parser.add_argument('--fixtures', default='fixtures/hikerapi.jsonl', help="fixtures file (replay/record)")
+    parser.add_argument('--urls', help="text file with post URLs (required for replay/record)")
+    
+    synthetic = parser.add_argument_group("synthetic posts (fake mode)")
+    synthetic.add_argument('--posts', type=int, default=20)
+    synthetic.add_argument('--comments', type=int, default=200, help="top-level comments per post")
+    synthetic.add_argument('--reply-ratio', type=float, default=0.2, help="share of comments with replies")
+    synthetic.add_argument('--replies', type=int, default=5, help="replies per thread")
+    synthetic.add_argument('--likers', type=int, default=1000, help="likers per post")
+    
+    api = parser.add_argument_group("simulated API (fake/replay modes)")
+    api.add_argument('--latency', type=float, default=0.05, help="seconds per call")
+    api.add_argument('--latency-jitter', type=float, default=0.02)
+    api.add_argument('--slow-ratio', type=float, default=0.0, help="share of calls in the slow tail")
+    api.add_argument('--slow-latency', type=float, default=2.0, help="seconds per slow call")
+    api.add_argument('--rate-limit-ratio', type=float, default=0.0, help="share of calls failing with 429")
+    api.add_argument('--error-ratio', type=float, default=0.0, help="share of calls failing with 503")
+    
+    run = parser.add_argument_group("scraper settings")
+    run.add_argument('--rps', type=float, default=50.0, help="REQUESTS_PER_SECOND (and maximum) per token")
+    run.add_argument('--tokens', type=int, default=1, help="number of simulated API tokens (fake/replay modes)")
+    run.add_argument('--concurrency', type=int, default=config.MAX_CONCURRENT_POSTS, help="MAX_CONCURRENT_POSTS")
+    run.add_argument('--cache', action='store_true', help="keep the response cache enabled")
+    run.add_argument('--timeout', type=float, default=None, help="API_TIMEOUT for every endpoint (seconds)")
+    run.add_argument('--hedge', action='store_true', help="enable hedged requests (HEDGE_ENABLED)")
+    run.add_argument('--hedge-budget', type=float, default=config.HEDGE_BUDGET, help="HEDGE_BUDGET")
+    run.add_argument('--json', help="also write the results to this JSON file")
+    
+    assembly = parser.add_argument_group("assembly micro-benchmark")
+    assembly.add_argument('--rows-likers', type=int, default=1_000_000)
+    assembly.add_argument('--rows-comments', type=int, default=500_000)
+    return parser.parse_args()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where unsupported)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def set_option(scraper, name, value):
+    """Override a setting for the run (scraper imports its own copy from config)"""
+    setattr(config, name, value)
+    setattr(scraper, name, value)
+
+
+def run_pipeline(client, urls, args):
+    """Run scraper.main() in a temporary directory with every API call going to client"""
+    import scraper
+    
+    workdir = Path(tempfile.mkdtemp(prefix="scraper_bench_"))
+    (workdir / "post_urls.txt").write_text("\n".join(urls) + "\n", encoding='utf-8')
+    
+    scraper.Client = lambda *a, **kw: client
+    if args.mode != 'record':
+        set_option(scraper, 'HIKERAPI_TOKEN', "offline-benchmark-1")
+        set_option(scraper, 'HIKERAPI_TOKENS', [f"offline-benchmark-{i}" for i in range(2, args.tokens + 1)])
+    set_option(scraper, 'OUTPUT_DIRECTORY', str(workdir / "output"))
+    set_option(scraper, 'CACHE_ENABLED', args.cache)
+    set_option(scraper, 'MAX_CONCURRENT_POSTS', args.concurrency)
+    set_option(scraper, 'REQUESTS_PER_SECOND', args.rps)
+    set_option(scraper, 'MAX_REQUESTS_PER_SECOND', args.rps)
+    set_option(scraper, 'MIN_REQUESTS_PER_SECOND', min(config.MIN_REQUESTS_PER_SECOND, args.rps))
+    set_option(scraper, 'RATE_LIMIT_BURST', max(1, int(args.rps)))
+    set_option(scraper, 'HEDGE_ENABLED', args.hedge)
+    set_option(scraper, 'HEDGE_BUDGET', args.hedge_budget)
+    if args.timeout:
+        set_option(scraper, 'API_TIMEOUT', args.timeout)
+        set_option(scraper, 'API_TIMEOUTS', {})
+    
+    cwd = os.getcwd()
+    argv = sys.argv
+    os.chdir(workdir)
+    sys.argv = ["scraper.py"]
+    
+    try:
+        start = time.perf_counter()
+        scraper.main()
+        return time.perf_counter() - start, workdir
+    finally:
+        os.chdir(cwd)
+        sys.argv = argv
+
+
+# ============================================
+# ASSEMBLY MICRO-BENCHMARK
+# ============================================
+
+def pandas_save_results(posts, path):
+    """
+    Original save_results: every row of the run as a dict, then one DataFrame and to_csv
+    Its input (all comments and likers as dicts) is built before the call, as the scraper did
+    """
+    import pandas as pd
+    
+    all_posts_info, all_comments, all_likers = posts
+    all_data = []
+    
+    for post in all_posts_info:
+        row = post.copy()
+        row['data_type'] = 'POST'
+        row['data_user'] = post['author']
+        row['data_text'] = post['caption']
+        row['data_date'] = post['publication_date']
+        all_data.append(row)
+    
+    for comment in all_comments:
+        all_data.append({
+            'original_url': comment['original_url'],
+            'shortcode': comment['shortcode'],
+            'data_type': comment['type'].upper(),
+            'data_user': comment['username'],
+            'data_full_name': comment['full_name'],
+            'data_user_id': comment['user_id'],
+            'data_text': comment['text'],
+            'data_date': comment['date'],
+            'data_likes': comment['likes'],
+            'data_is_verified': comment['is_verified'],
+            'parent_user': comment['parent_user'],
+            'comment_id': comment['comment_id'],
+            'reply_count': comment['reply_count']
+        })
+    
+    for liker in all_likers:
+        all_data.append({
+            'original_url': liker['original_url'],
+            'shortcode': liker['shortcode'],
+            'data_type': 'LIKE',
+            'data_user': liker['username'],
+            'data_full_name': liker['full_name'],
+            'data_user_id': liker['user_id'],
+            'data_is_verified': liker['is_verified'],
+            'data_is_private': liker['is_private']
+        })
+    
+    df_all = pd.DataFrame(all_data)
+    cols = df_all.columns.tolist()
+    cols.remove('original_url')
+    df_all = df_all[['original_url'] + cols]
+    df_all.to_csv(path, index=False, encoding='utf-8-sig')
+
+
+def legacy_csv_rows(post_info, comments, likers):
+    """Previous streaming CSV rows: one dict per row"""
+    row = dict(post_info)
+    row.update(data_type='POST', data_user=post_info['author'], data_text=post_info['caption'],
+               data_date=post_info['publication_date'])
+    yield row
+    
+    for comment in comments:
+        yield {
+            'original_url': comment['original_url'],
+            'shortcode': comment['shortcode'],
+            'data_type': comment['type'].upper(),
+            'data_user': comment['username'],
+            'data_full_name': comment['full_name'],
+            'data_user_id': comment['user_id'],
+            'data_text': comment['text'],
+            'data_date': comment['date'],
+            'data_likes': comment['likes'],
+            'data_is_verified': comment['is_verified'],
+            'parent_user': comment['parent_user'],
+            'comment_id': comment['comment_id'],
+            'reply_count': comment['reply_count']
+        }
+    
+    for liker in likers:
+        yield {
+            'original_url': liker['original_url'],
+            'shortcode': liker['shortcode'],
+            'data_type': 'LIKE',
+            'data_user': liker['username'],
+            'data_full_name': liker['full_name'],
+            'data_user_id': liker['user_id'],
+            'data_is_verified': liker['is_verified'],
+            'data_is_private': liker['is_private']
+        }
+
+
+def legacy_assembly(posts, path):
+    """Previous StreamingCSVWriter: csv.DictWriter fed one dict per row"""
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_COLUMNS, restval='', extrasaction='ignore')
+        writer.writeheader()
+        for post_info, comments, likers in posts:
+            writer.writerows(legacy_csv_rows(post_info, comments, likers))
+
+
+def columnar_assembly(posts, path):
+    """Current StreamingCSVWriter: rows built column by column"""
+    writer = StreamingCSVWriter(path)
+    for post_info, comments, likers in posts:
+        writer.write_post(post_info, comments, likers)
+    writer.close()
+
+
+def synthetic_records(n_comments, n_likers, n_posts=100):
+    """(post_info, CommentBuffer, LikerBuffer) per post, shaped like the scraper's output"""
+    import scraper
+    
+    client = FakeClient()
+    urls = [f"https://www.instagram.com/p/FAKE{i:05d}/" for i in range(n_posts)]
+    posts = [scraper.get_post_info(client, url)[0] for url in urls]
+    comments = [CommentBuffer(post['original_url'], post['shortcode']) for post in posts]
+    likers = [LikerBuffer(post['original_url'], post['shortcode']) for post in posts]
+    
+    for i in range(n_comments):
+        url = urls[i % n_posts]
+        comments[i % n_posts].append(scraper.parse_comment({
+            'pk': str(10**9 + i), 'text': f'Comment {i}', 'created_at': 1704110400 + i,
+            'comment_like_count': i % 7, 'child_comment_count': 0,
+            'user': {'pk': 2000 + i % 5000, 'username': f'user_{i % 5000}'}
+        }, url, is_reply=i % 4 == 0, parent_username='user_0'))
+    
+    for i in range(n_likers):
+        post = posts[i % n_posts]
+        likers[i % n_posts].append({
+            'original_url': post['original_url'], 'shortcode': post['shortcode'],
+            'username': f'liker_{i}', 'full_name': f'Liker {i}', 'user_id': 5000 + i,
+            'is_verified': False, 'is_private': i % 3 == 0,
+        })
+    
+    return list(zip(posts, comments, likers))
+
+
+def measure(func, *args):
+    """(seconds, peak traced MB) of func(*args); memory is measured in a second, traced run"""
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024)
+
+
+def run_assembly_benchmark(args):
+    """Compare the original pandas save_results, the row-dict and the column-oriented CSV assembly"""
+    print_info(f"Generating {args.rows_comments:,} comments and {args.rows_likers:,} likers...")
+    records = synthetic_records(args.rows_comments, args.rows_likers)
+    
+    path = Path(tempfile.mkdtemp(prefix="scraper_bench_")) / "assembly.csv"
+    results = {'mode': 'assembly', 'comments': args.rows_comments, 'likers': args.rows_likers}
+    
+    print_info("Measuring column-oriented assembly...")
+    new_time, new_mem = measure(columnar_assembly, records, path)
+    results.update(columnar_seconds=round(new_time, 2), columnar_peak_mb=round(new_mem, 1))
+    
+    print_info("Measuring row-dict assembly...")
+    legacy_time, legacy_mem = measure(legacy_assembly, records, path)
+    results.update(rowdict_seconds=round(legacy_time, 2), rowdict_peak_mb=round(legacy_mem, 1))
+    
+    if importlib.util.find_spec('pandas') is None:
+        print_info("pandas not installed: skipping the original save_results")
+    else:
+        # The original scraper held every row as a dict for the whole run; that input is
+        # built outside the measurement, so its peak only counts save_results itself
+        run_rows = ([post for post, _, _ in records],
+                    [row for _, comments, _ in records for row in comments.to_dicts()],
+                    [row for _, _, likers in records for row in likers.to_dicts()])
+        print_info("Measuring original pandas save_results...")
+        pandas_time, pandas_mem = measure(pandas_save_results, run_rows, path)
+        del run_rows
+        results.update(pandas_seconds=round(pandas_time, 2), pandas_peak_mb=round(pandas_mem, 1),
+                       speedup_vs_pandas=round(pandas_time / new_time, 2),
+                       memory_reduction_vs_pandas=round(pandas_mem / new_mem, 1))
+    
+    path.unlink()
+    path.parent.rmdir()
+    return results
+
+
+def print_results(results, json_path=None):
+    print_header("BENCHMARK RESULTS")
+    for key, value in results.items():
+        print(f"  {key}: {value}")
+    
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print_info(f"Results written to {json_path}")
+
+
+def load_urls(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip().startswith('http')]
+
+
+def main():
+    """Main execution function"""
+    args = parse_args()
+    
+    if args.mode == 'assembly':
+        print_results(run_assembly_benchmark(args), args.json)
+        return
+    
+    simulated = dict(
+        latency=args.latency, latency_jitter=args.latency_jitter,
+        slow_ratio=args.slow_ratio, slow_latency=args.slow_latency,
+        rate_limit_ratio=args.rate_limit_ratio, error_ratio=args.error_ratio
+    )
+    
+    if args.mode == 'fake':
+        urls = [f"https://www.instagram.com/p/FAKE{i:05d}/" for i in range(args.posts)]
+        client = FakeClient(
+            comments=args.comments, reply_ratio=args.reply_ratio,
+            replies=args.replies, likers=args.likers, **simulated
+        )
+    else:
+        if not args.urls:
+            print_error("--urls is required for replay and record modes")
+            sys.exit(1)
+        urls = load_urls(args.urls)
+        
+        if args.mode == 'replay':
+            client = ReplayClient(args.fixtures, **simulated)
+        else:
+            from hikerapi import Client
+            fixtures = Path(args.fixtures).resolve()
+            client = RecordingClient(Client(token=config.HIKERAPI_TOKEN), fixtures)
+            print_info(f"Recording responses to {fixtures}")
+    
+    elapsed, workdir = run_pipeline(client, urls, args)
+    
+    calls = getattr(client, 'calls', {})
+    total_calls = sum(calls.values())
+    results = {
+        'mode': args.mode,
+        'posts': len(urls),
+        'concurrency': args.concurrency,
+        'tokens': args.tokens if args.mode != 'record' else 1,
+        'elapsed_seconds': round(elapsed, 3),
+        'posts_per_hour': round(len(urls) / elapsed * 3600, 1) if elapsed else None,
+        'api_calls': total_calls,
+        'api_calls_per_post': round(total_calls / len(urls), 2) if urls else None,
+        'api_calls_by_endpoint': calls,
+        'rate_limited_calls': getattr(client, 'rate_limited', 0),
+        'server_error_calls': getattr(client, 'errors', 0),
+        'peak_rss_mb': round(peak_rss_mb(), 1) if peak_rss_mb() else None,
+        'output_directory': str(workdir / "output"),
+    }
+    
+    # Call latency seen by the scraper (after hedging and timeouts), from the run metrics
+    summary_path = workdir / "output" / config.METRICS_SUMMARY_FILENAME
+    if summary_path.exists():
+        summary = json.loads(summary_path.read_text(encoding='utf-8'))
+        results['latency_p50_p99_seconds'] = {
+            name: [endpoint['latency_seconds']['p50'], endpoint['latency_seconds']['p99']]
+            for name, endpoint in summary['endpoints'].items()
+        }
+        results['hedging'] = summary.get('hedging')
+    
+    print_results(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,29 @@ DO NOT share this file with your token!
 # Get it from: https://hikerapi.com/
 HIKERAPI_TOKEN = "<YOUR_TOKEN_HERE>"
 
+# Additional access keys (optional)
+# Every token gets its own rate budget, calls go to the least-loaded one
+# Example: HIKERAPI_TOKENS = ["token_2", "token_3"]
+HIKERAPI_TOKENS = []
+
+# Seconds a token is left out of rotation after an error, per error class
+# (doubled on each consecutive failure, up to TOKEN_MAX_COOLDOWN)
+TOKEN_COOLDOWN = {
+    'auth': 900,        # 401 Unauthorized
+    'forbidden': 300,   # 403 Forbidden
+    'rate_limit': 60,   # 429 Too Many Requests
+}
+TOKEN_MAX_COOLDOWN = 3600
+
+# Consecutive 429 answers before a token is taken out of rotation
+# (isolated ones only lower the token's request rate)
+TOKEN_RATE_LIMIT_STRIKES = 3
+
+# Successful token validations are remembered for this many seconds, so
+# restarts skip the test request (stored in OUTPUT_DIRECTORY, 0 = always validate)
+TOKEN_VALIDATION_TTL = 24 * 3600
+TOKEN_VALIDATION_FILENAME = "token_validation.json"
+
 # ============================================
 # EXTRACTION PARAMETERS
 # ============================================
@@ -20,17 +43,105 @@ MAX_COMMENTS = None  # Maximum comments to extract (None = all)
 MAX_LIKERS = None    # Maximum likes to extract (None = all)
 
 # ============================================
-# RATE LIMITING (seconds)
+# RATE LIMITING
 # ============================================
 
-# Delay between API requests (min, max)
-DELAY_BETWEEN_REQUESTS = (1.5, 3.0)
+# Target API request rate per token, shared by all workers (requests per second)
+REQUESTS_PER_SECOND = 0.5
+
+# Bounds for the adaptive rate (requests per second)
+MIN_REQUESTS_PER_SECOND = 0.1
+MAX_REQUESTS_PER_SECOND = 2.0
 
-# Delay between complete posts (min, max)
-DELAY_BETWEEN_POSTS = (5.0, 10.0)
+# Number of requests allowed in a burst after an idle period
+RATE_LIMIT_BURST = 1
 
-# Delay after errors
-DELAY_AFTER_ERROR = 10.0
+# Adaptive backoff: on a rate-limit error the rate is multiplied by
+# RATE_DECREASE_FACTOR, then raised by RATE_INCREASE_STEP after every
+# RATE_RECOVERY_SUCCESSES successful requests
+RATE_DECREASE_FACTOR = 0.5
+RATE_INCREASE_STEP = 0.05
+RATE_RECOVERY_SUCCESSES = 10
+
+# Retries of failed API calls (server errors, timeouts, rate limits):
+# attempt n waits a random time up to RETRY_BASE_DELAY * 2^(n-1), capped at RETRY_MAX_DELAY
+RETRY_MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# Circuit breaker per endpoint: after CIRCUIT_FAILURE_THRESHOLD transient errors
+# in a row, calls to the endpoint pause for CIRCUIT_RESET_TIMEOUT seconds
+# before a single probe call is let through
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30.0
+
+# ============================================
+# TIMEOUTS AND HEDGING
+# ============================================
+
+# Seconds an API call may take before it fails with a transient error (and is retried)
+API_TIMEOUT = 30.0
+
+# Per-endpoint overrides of API_TIMEOUT
+# Example: API_TIMEOUTS = {'comments_threaded_chunk_gql': 60.0}
+API_TIMEOUTS = {}
+
+# Hedged requests: a call still running at its endpoint's observed p95 latency
+# is sent a second time and the first answer wins
+HEDGE_ENABLED = False
+
+# Extra calls allowed for hedging, as a share of all calls (0.05 = 5%)
+HEDGE_BUDGET = 0.05
+
+# Latency samples an endpoint needs before its calls are hedged
+HEDGE_MIN_SAMPLES = 20
+
+# ============================================
+# CONCURRENCY
+# ============================================
+
+# Number of posts processed at the same time (1 = sequential)
+MAX_CONCURRENT_POSTS = 1
+
+# Reply threads fetched in parallel per post, while comment pages keep
+# loading (1 = fetch each thread inline)
+REPLY_WORKERS = 4
+
+# Maximum reply threads waiting to be fetched per post
+REPLY_QUEUE_SIZE = 50
+
+# Keep-alive connections shared by every API client of the run (token
+# validation, planning, scraping); None = sized to MAX_CONCURRENT_POSTS and REPLY_WORKERS
+HTTP_POOL_SIZE = None
+
+# Multiplex requests over HTTP/2 when the optional h2 package is installed
+# (pip install "httpx[http2]")
+HTTP2_ENABLED = True
+
+# ============================================
+# RESPONSE CACHE
+# ============================================
+
+# Cache API responses on disk so re-runs and retries skip known requests
+CACHE_ENABLED = True
+
+# Cache database (stored in OUTPUT_DIRECTORY)
+CACHE_FILENAME = "api_cache.sqlite"
+
+# Maximum cache size in MB (least recently used entries are evicted)
+CACHE_MAX_MB = 500
+
+# Time to live per endpoint in seconds (None = never expires)
+# ":first_page" applies to the first page of paginated endpoints
+CACHE_TTL = {
+    'media_by_code_v1': 3600,                   # like/comment counts
+    'media_likers_chunk_gql:first_page': 3600,  # newest likers
+    'media_likers_chunk_gql': 6 * 3600,
+    'comments_chunk_gql:first_page': 3600,      # newest comments
+    'comments_chunk_gql': 7 * 24 * 3600,        # older comment pages
+    'comments_threaded_chunk_gql:first_page': 6 * 3600,
+    'comments_threaded_chunk_gql': 7 * 24 * 3600,
+}
 
 # ============================================
 # INPUT/OUTPUT CONFIGURATION
@@ -45,6 +156,89 @@ OUTPUT_DIRECTORY = "output"
 # Output filename
 OUTPUT_FILENAME = "instagram_extraction.csv"
 
+# Output format
+# "csv"     = single unified CSV file
+# "parquet" = typed Parquet datasets (posts/, comments/, likes/) partitioned
+#             by shortcode, in a directory named after OUTPUT_FILENAME (requires pyarrow)
+# "sqlite"  = normalized database (posts, comments, likes, users) named after
+#             OUTPUT_FILENAME, kept and updated across runs
+OUTPUT_FORMAT = "csv"
+
+# Run journal (one line per completed post, stored in OUTPUT_DIRECTORY)
+# Used by `python scraper.py --resume` to continue an interrupted batch
+JOURNAL_FILENAME = "journal.jsonl"
+
+# Incremental state (newest known comment and reply counts per post)
+# Used by `python scraper.py --incremental` to fetch only new comments
+INCREMENTAL_STATE_FILENAME = "incremental_state.sqlite"
+
+# Index of every post already scraped (shortcode and time, stored in OUTPUT_DIRECTORY)
+# Posts in the index are skipped by csv_to_url.py and scraper.py before any API call
+# (not with --incremental, or with --rescrape / --include-scraped)
+SCRAPED_INDEX_FILENAME = "scraped_index.sqlite"
+SKIP_SCRAPED_POSTS = True
+
+# ============================================
+# METRICS
+# ============================================
+
+# Per-endpoint call counts, errors and latencies, and time spent sleeping
+METRICS_ENABLED = True
+
+# Prometheus textfile, rewritten every METRICS_EXPORT_INTERVAL seconds
+# (stored in OUTPUT_DIRECTORY, e.g. for node_exporter's textfile collector)
+METRICS_FILENAME = "scraper_metrics.prom"
+METRICS_EXPORT_INTERVAL = 15
+
+# JSON summary written at the end of the run (stored in OUTPUT_DIRECTORY)
+METRICS_SUMMARY_FILENAME = "metrics_summary.json"
+
+# Timeline of posts, phases, API calls and sleeps written by `python scraper.py --trace`
+# (Chrome Trace Event format, stored in OUTPUT_DIRECTORY)
+TRACE_FILENAME = "trace.json"
+
+# ============================================
+# PLANNING
+# ============================================
+
+# Used by `python scraper.py --plan` / `--plan-only`: media info of every post is
+# fetched first, then posts are scheduled by their estimated API-call cost
+# "input"    = keep the order of the input file
+# "cheapest" = smallest posts first (most posts finished early)
+# "largest"  = biggest posts first (long tails start early)
+# "fair"     = alternate small and large posts
+PLAN_POLICY = "cheapest"
+
+# Cost model: top-level comments returned per comments_chunk_gql call,
+# share of comments with a reply thread (one comments_threaded_chunk_gql call each),
+# and likers returned per media_likers_chunk_gql page
+PLAN_COMMENTS_PER_CALL = 30
+PLAN_REPLY_THREAD_RATIO = 0.1
+PLAN_LIKERS_PER_CALL = 50
+
+# Used by `python scraper.py --deadline 2h`: share of the time budget kept free
+# for writing the output, and smallest comment cap given to a post while time is left
+DEADLINE_SAFETY_MARGIN = 0.05
+DEADLINE_MIN_COMMENTS = 15
+
+# ============================================
+# SHARED WORK QUEUE
+# ============================================
+
+# Used by `python scraper.py --queue PATH` to share a batch between hosts
+
+# Seconds a leased post stays invisible to other workers without a heartbeat
+QUEUE_VISIBILITY_TIMEOUT = 600
+
+# Seconds between lease heartbeats (well below the visibility timeout)
+QUEUE_HEARTBEAT_INTERVAL = 60
+
+# Leases per post before it is marked failed
+QUEUE_MAX_ATTEMPTS = 3
+
+# Seconds an idle worker waits before checking for expired leases
+QUEUE_POLL_INTERVAL = 15
+
 # ============================================
 # CONSOLE COLORS (ANSI)
 # ============================================
@@ -161,12 +355,74 @@ def validate_config():
     if HIKERAPI_TOKEN == "<YOUR_TOKEN_HERE>" or not HIKERAPI_TOKEN:
         errors.append("HikerAPI token not configured")
     
-    # Check delays
-    if DELAY_BETWEEN_REQUESTS[0] < 0.5:
-        warnings.append("DELAY_BETWEEN_REQUESTS minimum is very low, risk of rate limiting")
+    if not isinstance(HIKERAPI_TOKENS, (list, tuple)):
+        errors.append("HIKERAPI_TOKENS must be a list of tokens")
+    
+    if any(seconds <= 0 for seconds in TOKEN_COOLDOWN.values()):
+        errors.append("TOKEN_COOLDOWN values must be greater than 0")
+    
+    if TOKEN_RATE_LIMIT_STRIKES < 1:
+        errors.append("TOKEN_RATE_LIMIT_STRIKES must be at least 1")
+    
+    # Check rate limiting
+    if not MIN_REQUESTS_PER_SECOND <= REQUESTS_PER_SECOND <= MAX_REQUESTS_PER_SECOND:
+        errors.append("REQUESTS_PER_SECOND must be between MIN_REQUESTS_PER_SECOND and MAX_REQUESTS_PER_SECOND")
+    
+    if MIN_REQUESTS_PER_SECOND <= 0:
+        errors.append("MIN_REQUESTS_PER_SECOND must be greater than 0")
+    
+    if not 0 < RATE_DECREASE_FACTOR < 1:
+        errors.append("RATE_DECREASE_FACTOR must be between 0 and 1")
+    
+    # Check retries
+    if RETRY_MAX_ATTEMPTS < 1:
+        errors.append("RETRY_MAX_ATTEMPTS must be at least 1")
+    
+    if CIRCUIT_FAILURE_THRESHOLD < 1:
+        errors.append("CIRCUIT_FAILURE_THRESHOLD must be at least 1")
+    
+    if HTTP_POOL_SIZE is not None and HTTP_POOL_SIZE < 1:
+        errors.append("HTTP_POOL_SIZE must be at least 1 (or None)")
+    
+    # Check timeouts and hedging
+    if any(seconds is not None and seconds <= 0 for seconds in [API_TIMEOUT, *API_TIMEOUTS.values()]):
+        errors.append("API_TIMEOUT and API_TIMEOUTS values must be greater than 0 (or None)")
+    
+    if not 0 <= HEDGE_BUDGET <= 1:
+        errors.append("HEDGE_BUDGET must be between 0 and 1")
+    
+    if MAX_REQUESTS_PER_SECOND > 2.0:
+        warnings.append("MAX_REQUESTS_PER_SECOND is very high, risk of rate limiting")
+    
+    # Check output format
+    if OUTPUT_FORMAT not in ("csv", "parquet", "sqlite"):
+        errors.append("OUTPUT_FORMAT must be 'csv', 'parquet' or 'sqlite'")
+    
+    # Check concurrency
+    if MAX_CONCURRENT_POSTS < 1:
+        errors.append("MAX_CONCURRENT_POSTS must be at least 1")
+    elif MAX_CONCURRENT_POSTS > 8:
+        warnings.append("MAX_CONCURRENT_POSTS is high, risk of rate limiting")
+    
+    if REPLY_WORKERS < 1 or REPLY_QUEUE_SIZE < 1:
+        errors.append("REPLY_WORKERS and REPLY_QUEUE_SIZE must be at least 1")
+    
+    # Check planning
+    if PLAN_POLICY not in ("input", "cheapest", "largest", "fair"):
+        errors.append("PLAN_POLICY must be 'input', 'cheapest', 'largest' or 'fair'")
+    
+    if PLAN_COMMENTS_PER_CALL < 1:
+        errors.append("PLAN_COMMENTS_PER_CALL must be at least 1")
+    
+    if PLAN_LIKERS_PER_CALL < 1:
+        errors.append("PLAN_LIKERS_PER_CALL must be at least 1")
+    
+    if not 0 <= DEADLINE_SAFETY_MARGIN < 1:
+        errors.append("DEADLINE_SAFETY_MARGIN must be between 0 and 1")
     
-    if DELAY_BETWEEN_POSTS[0] < 2.0:
-        warnings.append("DELAY_BETWEEN_POSTS minimum is low, consider increasing")
+    # Check work queue
+    if QUEUE_HEARTBEAT_INTERVAL >= QUEUE_VISIBILITY_TIMEOUT:
+        errors.append("QUEUE_HEARTBEAT_INTERVAL must be shorter than QUEUE_VISIBILITY_TIMEOUT")
     
     # Print results
     if errors:
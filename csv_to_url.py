@@ -1,18 +1,36 @@
 #!/usr/bin/env python3
 """
 CSV to URL Extractor
-Extracts Instagram post URLs from CSV file and generates a Python list or text file
+Extracts Instagram post URLs from CSV files (plain, .gz or .zst, globs allowed)
+and generates a Python list or text file
 """
 
+import argparse
 import csv
+import glob
+import gzip
+import io
+import os
+import sqlite3
 import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from shortcodes import ScrapedIndex, canonical_shortcode, canonical_url
+
 # Import config for colors
 try:
-    from config import Colors, print_header, print_success, print_error, print_warning, print_info
+    from config import (
+        OUTPUT_DIRECTORY, SCRAPED_INDEX_FILENAME, SKIP_SCRAPED_POSTS,
+        Colors, print_header, print_success, print_error, print_warning, print_info
+    )
 except ImportError:
     # Fallback if config not available
+    OUTPUT_DIRECTORY = "output"
+    SCRAPED_INDEX_FILENAME = "scraped_index.sqlite"
+    SKIP_SCRAPED_POSTS = True
+    
     class Colors:
         RESET = ""
         GREEN = ""
@@ -133,85 +151,252 @@ def ask_for_output_filename(default="post_urls"):
     return filename
 
 """
-def extract_urls(input_csv, column_name, output_format, output_base):
-    """Extract URLs from CSV and save in specified format(s)"""
-    urls = []
+# ============================================
+# STREAMING EXTRACTION
+# ============================================
 
-    try:
-        with open(input_csv, newline='', encoding="utf-8") as f:
-            # Try as CSV first
-            try:
-                reader = csv.DictReader(f)
-                fieldnames = reader.fieldnames
-                
-                # Handle column by name
-                if isinstance(column_name, str):
-                    if column_name not in fieldnames:
-                        print_error(f"Column '{column_name}' not found")
-                        print_info(f"Available columns: {', '.join(fieldnames)}")
-                        raise ValueError(f"Missing '{column_name}' column in CSV file")
-                    
-                    for row in reader:
-                        url = row.get(column_name)
-                        if url:
-                            urls.append(url.strip())
-                
-                # Handle column by index
-                else:
-                    f.seek(0)
-                    reader = csv.reader(f)
-                    header = next(reader)
-                    
-                    if column_name >= len(header):
-                        raise ValueError(f"Column index {column_name} out of range (max: {len(header)-1})")
-                    
-                    for row in reader:
-                        if len(row) > column_name:
-                            url = row[column_name]
-                            if url:
-                                urls.append(url.strip())
-            
-            except csv.Error:
-                # If CSV parsing fails, try line by line (maybe it's just a text file)
-                f.seek(0)
-                print_warning("CSV parsing failed, trying line-by-line reading")
-                for line in f:
-                    line = line.strip()
-                    if line and (line.startswith("http://") or line.startswith("https://")):
-                        urls.append(line)
+# URLs per spool batch and per seen-set transaction
+BATCH_SIZE = 10000
 
-    except Exception as e:
-        print_error(f"Error reading CSV: {e}")
-        raise
 
-    # Remove duplicates while preserving order
-    urls = list(dict.fromkeys(urls))
+def open_text(path):
+    """Open a plain, .gz or .zst file as UTF-8 text"""
+    path = Path(path)
+    suffix = path.suffix.lower()
     
-    print_success(f"{len(urls)} unique URLs extracted")
+    if suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    if suffix == ".zst":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("Reading .zst files requires zstandard: pip install zstandard")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True),
+                                encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
 
-    # Save outputs
-    try:
+
+def expand_inputs(patterns):
+    """Expand glob patterns (** allowed) into existing files, in order, without duplicates"""
+    paths = []
+    for pattern in map(str, patterns):
+        if not glob.has_magic(pattern):
+            if not Path(pattern).is_file():
+                raise FileNotFoundError(f"File not found: {pattern}")
+            paths.append(Path(pattern))
+            continue
+
+        matches = [Path(match) for match in sorted(glob.glob(pattern, recursive=True)) if Path(match).is_file()]
+        if not matches:
+            print_warning(f"No file matches: {pattern}")
+        paths.extend(matches)
+    return list(dict.fromkeys(paths))
+
+
+def iter_urls(input_file, column_name):
+    """Yield the URLs of one CSV (column by name or 0-based index) without loading it"""
+    with open_text(input_file) as f:
+        reader = csv.reader(f)
+        
+        try:
+            header = next(reader)
+        except StopIteration:
+            return
+        except csv.Error:
+            header = None
+        
+        if header is None:
+            # Not a CSV: maybe a plain list of URLs
+            f.seek(0)
+            print_warning(f"CSV parsing failed for {input_file}, trying line-by-line reading")
+            for line in f:
+                line = line.strip()
+                if line.startswith("http://") or line.startswith("https://"):
+                    yield line
+            return
+        
+        # Handle column by name
+        if isinstance(column_name, str):
+            if column_name not in header:
+                print_error(f"Column '{column_name}' not found in {input_file}")
+                print_info(f"Available columns: {', '.join(header)}")
+                raise ValueError(f"Missing '{column_name}' column in CSV file")
+            index = header.index(column_name)
+        
+        # Handle column by index
+        else:
+            if column_name >= len(header):
+                raise ValueError(f"Column index {column_name} out of range (max: {len(header)-1})")
+            index = column_name
+        
+        for row in reader:
+            if len(row) > index:
+                url = row[index].strip()
+                if url:
+                    yield url
+
+
+def spool_urls(input_file, column_name, spool_dir):
+    """
+    Worker task: copy the URLs of one input file to a spool file
+    Returns (spool path, number of URLs)
+    """
+    fd, spool_path = tempfile.mkstemp(suffix=".txt", dir=spool_dir)
+    count = 0
+    with os.fdopen(fd, "w", encoding="utf-8") as out:
+        for url in iter_urls(input_file, column_name):
+            out.write(url + "\n")
+            count += 1
+    return spool_path, count
+
+
+class SeenSet:
+    """Disk-backed set of keys (SQLite), so deduplication memory stays flat"""
+    
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=OFF")
+        self._conn.execute("PRAGMA synchronous=OFF")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS seen (key TEXT PRIMARY KEY) WITHOUT ROWID")
+        self._conn.execute("BEGIN")
+        self._pending = 0
+    
+    def add(self, key):
+        """Add key, returns True if it was not in the set yet"""
+        added = self._conn.execute("INSERT OR IGNORE INTO seen VALUES (?)", (key,)).rowcount == 1
+        self._pending += 1
+        if self._pending >= BATCH_SIZE:
+            self._conn.execute("COMMIT")
+            self._conn.execute("BEGIN")
+            self._pending = 0
+        return added
+    
+    def close(self):
+        self._conn.execute("COMMIT")
+        self._conn.close()
+
+
+class URLOutput:
+    """Write URLs to post_urls.py and/or .txt as they arrive"""
+    
+    def __init__(self, output_format, output_base):
+        self.files = []
+        self._py = self._txt = None
+        
         if output_format in ["python", "both"]:
-            output_py = Path(f"{output_base}.py")
-            with open(output_py, "w", encoding="utf-8") as f:
-                f.write("# Instagram Post URLs\n")
-                f.write("# Generated by csv_to_url.py\n\n")
-                f.write("POST_URLS = [\n")
-                for url in urls:
-                    f.write(f'    "{url}",\n')
-                f.write("]\n")
-            print_success(f"Python file created: {output_py}")
+            self._py = open(Path(f"{output_base}.py"), "w", encoding="utf-8")
+            self._py.write("# Instagram Post URLs\n")
+            self._py.write("# Generated by csv_to_url.py\n\n")
+            self._py.write("POST_URLS = [\n")
+            self.files.append(("Python file", Path(f"{output_base}.py")))
         
         if output_format in ["text", "both"]:
-            output_txt = Path(f"{output_base}.txt")
-            with open(output_txt, "w", encoding="utf-8") as f:
-                for url in urls:
-                    f.write(f"{url}\n")
-            print_success(f"Text file created: {output_txt}")
+            self._txt = open(Path(f"{output_base}.txt"), "w", encoding="utf-8")
+            self.files.append(("Text file", Path(f"{output_base}.txt")))
+    
+    def write(self, url):
+        if self._py:
+            self._py.write(f'    "{url}",\n')
+        if self._txt:
+            self._txt.write(f"{url}\n")
+    
+    def close(self):
+        if self._py:
+            self._py.write("]\n")
+            self._py.close()
+        if self._txt:
+            self._txt.close()
 
-    except Exception as e:
-        print_error(f"Error writing output file: {e}")
-        raise
+
+def extract_urls(input_csv, column_name, output_format, output_base, workers=None, index_path=None):
+    """
+    Extract URLs from one or more CSV files (paths or globs, plain/.gz/.zst)
+    and save them in the specified format(s)
+    
+    Files are parsed in parallel worker processes into spool files; the spools
+    are then read back in input order, deduplicated against a disk-backed seen-set
+    and written out incrementally, so memory does not grow with the input size.
+    URL variants of the same post (/reel/, ?igsh=...) count once and are written
+    as the canonical post URL; with index_path, posts already scraped are left out.
+    Returns the number of unique URLs written.
+    """
+    patterns = input_csv if isinstance(input_csv, (list, tuple)) else [input_csv]
+    paths = expand_inputs(patterns)
+    if not paths:
+        raise ValueError("No input files")
+    
+    workers = max(1, min(workers or os.cpu_count() or 1, len(paths)))
+    total = unique = scraped = 0
+    
+    # Posts scraped by previous runs (read only: the scraper maintains the index)
+    index = ScrapedIndex(index_path) if index_path and Path(index_path).exists() else None
+    
+    with tempfile.TemporaryDirectory(prefix="csv_to_url_") as work_dir:
+        seen = SeenSet(Path(work_dir) / "seen.sqlite")
+        output = URLOutput(output_format, output_base)
+        
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = [executor.submit(spool_urls, path, column_name, work_dir) for path in paths]
+                
+                # Files are merged in input order, so the first occurrence of a URL wins
+                for path, future in zip(paths, futures):
+                    try:
+                        spool_path, count = future.result()
+                    except Exception as e:
+                        print_error(f"Error reading {path}: {e}")
+                        raise
+                    
+                    new = 0
+                    with open(spool_path, "r", encoding="utf-8") as spool:
+                        for line in spool:
+                            url = line.rstrip("\n")
+                            shortcode = canonical_shortcode(url)
+                            if not seen.add(shortcode or url):
+                                continue
+                            if index is not None and shortcode and shortcode in index:
+                                scraped += 1
+                                continue
+                            output.write(canonical_url(shortcode) if shortcode else url)
+                            new += 1
+                    os.remove(spool_path)
+                    
+                    total += count
+                    unique += new
+                    print_info(f"{path}: {count:,} URLs ({new:,} new)")
+        finally:
+            output.close()
+            seen.close()
+            if index is not None:
+                index.close()
+    
+    print_success(f"{unique:,} unique URLs extracted ({total:,} rows read from {len(paths)} file(s))")
+    if scraped:
+        print_info(f"{scraped:,} posts skipped: already scraped (see {index_path})")
+    for label, path in output.files:
+        print_success(f"{label} created: {path}")
+    
+    return unique
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description="Extract Instagram post URLs from CSV exports")
+    parser.add_argument(
+        'inputs', nargs='*', metavar='INPUT',
+        help="CSV files or glob patterns (quoted), plain, .gz or .zst; asks interactively if omitted"
+    )
+    parser.add_argument('--column', default="url", help="URL column name or 0-based index (default: url)")
+    parser.add_argument('--format', choices=("python", "text", "both"), default="text",
+                        help="output format (default: text)")
+    parser.add_argument('--output', default="temp", help="output file name without extension (default: temp)")
+    parser.add_argument('--workers', type=int, default=None, help="parallel reader processes (default: CPU count)")
+    parser.add_argument('--include-scraped', action='store_true',
+                        help="keep posts already scraped by a previous run (listed in the scraped index)")
+    args = parser.parse_args()
+    if args.column.isdigit():
+        args.column = int(args.column)
+    return args
 
 
 def main():
@@ -219,26 +404,30 @@ def main():
     print_header("CSV → URL EXTRACTOR")
     print_info("Extract Instagram post URLs from CSV file\n")
     
+    args = parse_args()
+    
     try:
-        # Step 1: Get input CSV
-        input_csv = ask_for_csv()
+        # Step 1: Get input CSV (files and globs from the command line, else ask)
+        input_csv = args.inputs or [ask_for_csv()]
         
         # Step 2: Get column name
         print()
-        column_name = "url" #ask_for_column()
+        column_name = args.column #ask_for_column()
         
         # Step 3: Get output format
         print()
-        output_format = "text" #ask_for_output_format()
+        output_format = args.format #ask_for_output_format()
         
         # Step 4: Get output filename
         print()
-        output_base = "temp" #ask_for_output_filename()
+        output_base = args.output #ask_for_output_filename()
         
         # Step 5: Extract and save
         print()
         print_info("Processing...")
-        extract_urls(input_csv, column_name, output_format, output_base)
+        skip_scraped = SKIP_SCRAPED_POSTS and not args.include_scraped
+        index_path = Path(OUTPUT_DIRECTORY) / SCRAPED_INDEX_FILENAME if skip_scraped else None
+        extract_urls(input_csv, column_name, output_format, output_base, args.workers, index_path)
         
         print()
         print_header("EXTRACTION COMPLETE")
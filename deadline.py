@@ -0,0 +1,106 @@
+"""
+Deadline Budget
+Wall-clock budget for `--deadline` runs: turns the time left and the observed API
+throughput into per-post comment caps, so every post gets some data in time
+"""
+
+import re
+import time
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)([hms])')
+
+
+def parse_duration(text):
+    """Parse '2h', '90m', '1h30m', '45s' or a plain number of seconds"""
+    text = str(text).strip().lower()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(text)
+    if not parts or ''.join(number + unit for number, unit in parts) != text.replace(' ', ''):
+        raise ValueError(f"Invalid duration: {text!r} (use e.g. 2h, 90m, 1h30m, 45s)")
+
+    seconds = {'h': 3600, 'm': 60, 's': 1}
+    return sum(float(number) * seconds[unit] for number, unit in parts)
+
+
+class DeadlineBudget:
+    """
+    Time left before the deadline, and how many API calls it still buys
+
+    Throughput is measured from the limiter's request counter since the budget
+    started (falling back to its current rate until enough calls were made).
+    The cost of a comment starts from the planner's cost model and is replaced
+    by the calls actually spent per collected comment once the comments phase
+    is under way. A safety margin of the total budget is kept for writing the output.
+    """
+
+    def __init__(self, seconds, limiter, safety_margin=0.05, comments_per_call=30,
+                 reply_thread_ratio=0.1, min_comments=0, warmup_calls=20):
+        self.seconds = seconds
+        self.limiter = limiter
+        self.safety_margin = safety_margin
+        self.comments_per_call = comments_per_call
+        self.reply_thread_ratio = reply_thread_ratio
+        self.min_comments = min_comments
+        self.warmup_calls = warmup_calls
+        self.started = time.monotonic()
+        self._start_requests = limiter.total_requests
+        self._comments_requests = None
+        self._comments = 0
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        """Seconds left before the deadline, minus the safety margin"""
+        return self.seconds * (1 - self.safety_margin) - self.elapsed()
+
+    def throughput(self):
+        """Observed API calls per second over the run so far"""
+        calls = self.limiter.total_requests - self._start_requests
+        elapsed = self.elapsed()
+        if calls < self.warmup_calls or elapsed <= 0:
+            return self.limiter.current_rate
+        return calls / elapsed
+
+    def calls_left(self, reserved_calls=0):
+        """API calls that still fit before the deadline, after reserved_calls"""
+        return max(0.0, self.remaining() * self.throughput() - reserved_calls)
+
+    def expired(self, reserved_calls=0):
+        """True when not even one more call fits (after reserved_calls)"""
+        return self.calls_left(reserved_calls) < 1
+
+    def start_comments(self):
+        """Mark the start of the comments phase"""
+        self._comments_requests = self.limiter.total_requests
+
+    def observe_comments(self, count):
+        """Record comments collected for one post"""
+        self._comments += count
+
+    def calls_per_comment(self):
+        """API calls one comment costs: observed in the comments phase, else the cost model"""
+        if self._comments_requests is not None and self._comments >= self.min_comments + 1:
+            calls = self.limiter.total_requests - self._comments_requests
+            if calls >= self.warmup_calls:
+                return calls / self._comments
+        # Its share of a page, plus a reply thread for some comments
+        return 1 / self.comments_per_call + self.reply_thread_ratio
+
+    def comment_cap(self, posts_left, reserved_calls=0, max_comments=None):
+        """
+        Comments (replies included) one post may collect so the remaining posts
+        still get their share; 0 when the budget is spent
+        """
+        share = self.calls_left(reserved_calls) / max(1, posts_left)
+        if share < 1:
+            # Not even the first comments page fits
+            return 0
+
+        cap = int(share / self.calls_per_comment())
+        cap = max(cap, self.min_comments)
+        return min(cap, max_comments) if max_comments else cap
@@ -0,0 +1,263 @@
+"""
+Fake HikerAPI
+Offline stand-ins for the hikerapi.Client endpoints used by the scraper,
+plus record/replay of real responses as JSONL fixtures
+"""
+
+import json
+import random
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from api_cache import ResponseCache
+from api_errors import client_method, error_payload
+
+
+# Error answers, returned (not raised) like hikerapi.Client returns the API's error payloads
+RATE_LIMIT_ANSWER = {'detail': 'Too Many Requests', 'exc_type': 'ClientThrottledError'}
+SERVER_ERROR_ANSWER = {'detail': 'Service Unavailable', 'exc_type': 'ClientError'}
+
+
+class FakeClient:
+    """
+    In-process fake of the hikerapi.Client endpoints used by scraper.py
+    
+    Every shortcode gets a deterministic synthetic post:
+    - comments: top-level comments, newest first
+    - reply_ratio: share of comments that have a reply thread
+    - replies: replies per thread
+    - likers: users who liked the post
+    
+    Latency is latency +/- latency_jitter seconds per call, with a slow tail:
+    a share slow_ratio of calls takes slow_latency instead. A share
+    rate_limit_ratio of calls answers with a 429 error payload, and a share
+    error_ratio with a 503 one (returned, not raised, as hikerapi does).
+    """
+    
+    PAGE_SIZE = 15
+    LIKERS_PAGE_SIZE = 50
+    
+    def __init__(self, token=None, comments=200, reply_ratio=0.2, replies=5, likers=1000,
+                 latency=0.0, latency_jitter=0.0, slow_ratio=0.0, slow_latency=0.0,
+                 rate_limit_ratio=0.0, error_ratio=0.0, seed=0):
+        self.comments = comments
+        self.reply_ratio = reply_ratio
+        self.replies = replies
+        self.likers = likers
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.slow_ratio = slow_ratio
+        self.slow_latency = slow_latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.error_ratio = error_ratio
+        
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = {}
+        self.rate_limited = 0
+        self.errors = 0
+    
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+    
+    def _call(self, endpoint):
+        """
+        Count the call, simulate latency, injected rate limits and server errors
+        Returns the error answer to send instead of the response (None for none)
+        """
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            slow = self._random.random() < self.slow_ratio
+            limited = self._random.random() < self.rate_limit_ratio
+            failed = not limited and self._random.random() < self.error_ratio
+            delay = self.slow_latency if slow else self.latency + self._random.uniform(-1, 1) * self.latency_jitter
+            if limited:
+                self.rate_limited += 1
+            if failed:
+                self.errors += 1
+        
+        if delay > 0:
+            time.sleep(delay)
+        
+        if limited:
+            return dict(RATE_LIMIT_ANSWER)
+        if failed:
+            return dict(SERVER_ERROR_ANSWER)
+        return None
+    
+    @staticmethod
+    def _media_pk(shortcode):
+        # Keeps comment and reply pks derived from it within int64
+        return zlib.crc32(shortcode.encode()) + 1
+    
+    def _chunk(self, make_item, count, end_cursor, base):
+        """
+        Two pages per call after the cursor, like the *_chunk_gql endpoints
+        Items are numbered count..1 and their pk is base + number
+        """
+        first = count if not end_cursor else int(end_cursor) - base - 1
+        numbers = list(range(first, max(first - 2 * self.PAGE_SIZE, 0), -1))
+        
+        pages = [numbers[:self.PAGE_SIZE], numbers[self.PAGE_SIZE:]]
+        return [[make_item(n) for n in page] for page in pages if page]
+    
+    # ============================================
+    # ENDPOINTS
+    # ============================================
+    
+    def media_by_code_v1(self, code):
+        error = self._call('media_by_code_v1')
+        if error:
+            return error
+        return {
+            'pk': str(self._media_pk(code)),
+            'code': code,
+            'user': {'pk': 1000, 'username': 'fake_author', 'full_name': 'Fake Author'},
+            'like_count': self.likers,
+            'comment_count': self.comments,
+            'taken_at': '2024-01-01T12:00:00+00:00',
+            'media_type': 1,
+            'caption_text': f'Synthetic post {code}',
+            'location': None,
+        }
+    
+    def comments_chunk_gql(self, media_id, sort_order=None, end_cursor=None):
+        error = self._call('comments_chunk_gql')
+        if error:
+            return error
+        base = int(media_id) * 10**6
+        
+        def make_comment(i):
+            return {
+                'pk': str(base + i),
+                'text': f'Comment {i}',
+                'created_at': 1704110400 + i * 60,
+                'comment_like_count': i % 7,
+                'child_comment_count': self.replies if (i * 7919) % 100 < self.reply_ratio * 100 else 0,
+                'user': {'pk': 2000 + i % 500, 'username': f'user_{i % 500}', 'full_name': f'User {i % 500}'},
+            }
+        
+        # Newest comments first
+        return self._chunk(make_comment, self.comments, end_cursor, base)
+    
+    def comments_threaded_chunk_gql(self, media_id, comment_id, end_cursor=None):
+        error = self._call('comments_threaded_chunk_gql')
+        if error:
+            return error
+        base = int(comment_id) * 1000
+        
+        def make_reply(j):
+            return {
+                'pk': str(base + j),
+                'text': f'Reply {j}',
+                'created_at': 1704200000 + j * 60,
+                'comment_like_count': 0,
+                'user': {'pk': 3000 + j, 'username': f'replier_{j}', 'full_name': f'Replier {j}'},
+            }
+        
+        return self._chunk(make_reply, self.replies, end_cursor, base)
+    
+    @staticmethod
+    def _liker(i):
+        return {
+            'pk': 5000 + i,
+            'username': f'liker_{i}',
+            'full_name': f'Liker {i}',
+            'is_verified': i % 97 == 0,
+            'is_private': i % 3 == 0,
+        }
+    
+    def media_likers_gql(self, media_id):
+        error = self._call('media_likers_gql')
+        if error:
+            return error
+        return [self._liker(i) for i in range(self.likers)]
+    
+    def media_likers_chunk_gql(self, media_id, end_cursor=None):
+        """One page of likers and the cursor of the next one: [likers, next_cursor]"""
+        error = self._call('media_likers_chunk_gql')
+        if error:
+            return error
+        first = int(end_cursor) if end_cursor else 0
+        last = min(first + self.LIKERS_PAGE_SIZE, self.likers)
+        return [[self._liker(i) for i in range(first, last)], str(last) if last < self.likers else None]
+
+
+# ============================================
+# RECORD / REPLAY
+# ============================================
+
+class RecordingClient:
+    """
+    Wrap a real client and append every endpoint response to a JSONL fixtures file
+    Error answers (429/5xx payloads, non-JSON bodies) are not recorded, so a replay
+    serves the successful response of a call that was retried during recording
+    """
+    
+    def __init__(self, client, path):
+        self._client = client
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+    
+    def __getattr__(self, name):
+        attr = client_method(self._client, name)
+        if not callable(attr):
+            return attr
+        
+        def call(*args, **kwargs):
+            response = attr(*args, **kwargs)
+            if error_payload(response) is not None:
+                return response
+            line = json.dumps({
+                'key': ResponseCache.make_key(name, args, kwargs),
+                'response': response
+            }, default=str)
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            return response
+        
+        return call
+
+
+class ReplayClient(FakeClient):
+    """
+    Serve responses from a fixtures file written by RecordingClient
+    Latency and rate-limit injection work as in FakeClient; unknown calls get a 404 answer.
+    """
+    
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.fixtures = {}
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.fixtures[entry['key']] = entry['response']
+    
+    def _replay(self, endpoint, args, kwargs):
+        error = self._call(endpoint)
+        if error:
+            return error
+        key = ResponseCache.make_key(endpoint, args, kwargs)
+        if key not in self.fixtures:
+            return {'detail': f"Not found: no fixture for {endpoint} {args} {kwargs}", 'exc_type': 'NotFoundError'}
+        return self.fixtures[key]
+    
+    def media_by_code_v1(self, *args, **kwargs):
+        return self._replay('media_by_code_v1', args, kwargs)
+    
+    def comments_chunk_gql(self, *args, **kwargs):
+        return self._replay('comments_chunk_gql', args, kwargs)
+    
+    def comments_threaded_chunk_gql(self, *args, **kwargs):
+        return self._replay('comments_threaded_chunk_gql', args, kwargs)
+    
+    def media_likers_gql(self, *args, **kwargs):
+        return self._replay('media_likers_gql', args, kwargs)
+    
+    def media_likers_chunk_gql(self, *args, **kwargs):
+        return self._replay('media_likers_chunk_gql', args, kwargs)
@@ -0,0 +1,143 @@
+"""
+Timeouts and Hedged Requests
+Per-endpoint call timeouts, and a duplicate request for calls still running at
+their endpoint's observed p95 latency (first answer wins), within a budget
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import tracing
+
+
+class APITimeoutError(Exception):
+    """An API call that did not answer within its endpoint timeout (a transient error)"""
+
+
+class HedgePolicy:
+    """
+    When to hedge, shared by all clients of a run
+
+    latency(endpoint) returns (sample count, p95 seconds) of the endpoint; an
+    endpoint is hedged once it has min_samples latencies, at most `budget`
+    duplicates per call overall. The p95 is refreshed every `refresh` calls.
+    """
+
+    def __init__(self, latency, budget=0.05, min_samples=20, endpoints=None, refresh=50):
+        self.latency = latency
+        self.budget = budget
+        self.min_samples = min_samples
+        self.endpoints = set(endpoints) if endpoints else None
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._delays = {}   # endpoint -> (calls at refresh, p95)
+
+        # Counters for reporting
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.timeouts = 0
+
+    def delay(self, endpoint):
+        """Seconds after which a call to endpoint is hedged (None = never); counts the call"""
+        with self._lock:
+            self.calls += 1
+            if not self.budget or (self.endpoints is not None and endpoint not in self.endpoints):
+                return None
+            cached = self._delays.get(endpoint)
+            if cached is not None and self.calls - cached[0] < self.refresh:
+                return cached[1]
+
+        samples, p95 = self.latency(endpoint)
+        delay = p95 if samples >= self.min_samples else None
+        with self._lock:
+            self._delays[endpoint] = (self.calls, delay)
+        return delay
+
+    def try_hedge(self):
+        """Take a hedge from the budget, False when it is spent"""
+        with self._lock:
+            if self.hedges + 1 > self.budget * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def record(self, hedge_won=False, timed_out=False):
+        with self._lock:
+            self.hedge_wins += hedge_won
+            self.timeouts += timed_out
+
+
+class HedgedClient:
+    """
+    Wrap a HikerAPI client so every endpoint call has a timeout and may be hedged
+
+    Calls run on a small thread pool; the caller waits up to the endpoint's
+    timeout (timeouts.get(name, default_timeout)) and then gets an APITimeoutError.
+    A call still running after the policy's hedge delay is sent again (after
+    acquire(), e.g. the token's rate limiter) and the first successful answer
+    is returned. A timed-out call is abandoned; the HTTP client's own timeout ends it.
+    """
+
+    def __init__(self, client, default_timeout=None, timeouts=None, policy=None, acquire=None, max_workers=32):
+        self._client = client
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+        self.policy = policy
+        self.acquire = acquire
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api-call")
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        timeout = self.timeouts.get(name, self.default_timeout)
+
+        def duplicate(primary, *args, **kwargs):
+            if self.acquire:
+                self.acquire()
+            if primary.done() and primary.exception() is None:
+                # The primary answered while the duplicate waited for the rate limiter
+                return primary.result()
+            return attr(*args, **kwargs)
+
+        def call(*args, **kwargs):
+            delay = self.policy.delay(name) if self.policy else None
+            if timeout is None and delay is None:
+                return attr(*args, **kwargs)
+
+            deadline = time.monotonic() + timeout if timeout else None
+            primary = self._executor.submit(attr, *args, **kwargs)
+            pending = {primary}
+
+            if delay is not None and (deadline is None or delay < timeout):
+                done, _ = wait(pending, timeout=delay)
+                if not done and self.policy.try_hedge():
+                    tracing.instant(f"hedge {name}", "hedge")
+                    pending.add(self._executor.submit(duplicate, primary, *args, **kwargs))
+
+            # First successful answer wins; an error is raised once every attempt failed
+            error = None
+            while pending:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                if not done:
+                    break
+                for future in sorted(done, key=lambda f: f is not primary):
+                    if future.exception() is None:
+                        if self.policy and future is not primary:
+                            self.policy.record(hedge_won=True)
+                        return future.result()
+                    error = future.exception()
+
+            if not pending:
+                raise error
+
+            if self.policy:
+                self.policy.record(timed_out=True)
+            tracing.instant(f"timeout {name}", "hedge")
+            raise APITimeoutError(f"{name} timed out after {timeout:g}s")
+
+        return call
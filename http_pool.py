@@ -0,0 +1,75 @@
+"""
+Shared HTTP Pool
+One keep-alive httpx connection pool (HTTP/2 when the h2 package is installed)
+shared by every HikerAPI client of a run: token validation, planning and scraping
+"""
+
+import importlib.util
+import threading
+
+
+def http2_available():
+    """True if httpx can speak HTTP/2 (requires the optional h2 package)"""
+    return importlib.util.find_spec("h2") is not None
+
+
+class SharedHTTPPool:
+    """
+    Factory of HikerAPI clients that all send their requests through one httpx.Client
+
+    The access key travels in each request's headers, so clients of different
+    tokens can share connections (and TLS sessions). hikerapi and httpx are
+    imported when the first client is created.
+    """
+
+    def __init__(self, max_connections=10, http2=True, keepalive_expiry=60.0):
+        self.max_connections = max_connections
+        self.http2 = http2 and http2_available()
+        self.keepalive_expiry = keepalive_expiry
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._http = None
+        self.clients = 0
+    
+    def _record_status(self, response):
+        self._local.status = response.status_code
+    
+    def last_status(self):
+        """HTTP status of the calling thread's last response (hikerapi does not expose it)"""
+        return getattr(self._local, 'status', None)
+
+    def _shared(self, base_url):
+        with self._lock:
+            if self._http is None:
+                import httpx
+
+                self._http = httpx.Client(
+                    base_url=base_url,
+                    http2=self.http2,
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections,
+                        keepalive_expiry=self.keepalive_expiry,
+                    ),
+                    event_hooks={'response': [self._record_status]},
+                )
+            self.clients += 1
+            return self._http
+
+    def client(self, token=None, **kwargs):
+        """HikerAPI client for token on the shared connections (kwargs as hikerapi.Client, e.g. timeout)"""
+        from hikerapi import Client as HikerAPIClient
+        from hikerapi.base import BaseClient
+
+        # BaseClient sets the URL, key headers and timeout; BaseSyncClient would
+        # only add a private httpx.Client (and its TLS setup), replaced by the shared one
+        client = HikerAPIClient.__new__(HikerAPIClient)
+        BaseClient.__init__(client, token=token, **kwargs)
+        client._client = self._shared(client._url)
+        return client
+
+    def close(self):
+        with self._lock:
+            if self._http is not None:
+                self._http.close()
+                self._http = None
@@ -0,0 +1,125 @@
+"""
+Incremental State
+Per-shortcode comment high-watermarks so re-scrapes only fetch new comments and replies
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class PostWatermark:
+    """
+    What a previous run saw on one post, updated while the post is scraped
+    
+    - newest_created_at: creation time of the newest top-level comment
+    - scraped_at: when the previous run finished (replies newer than this are new)
+    - reply_counts: child_comment_count of every known top-level comment
+    """
+    
+    def __init__(self, shortcode, newest_pk=None, newest_created_at=0, scraped_at=None, reply_counts=None):
+        self.shortcode = shortcode
+        self.newest_pk = newest_pk
+        self.newest_created_at = newest_created_at or 0
+        self.scraped_at = scraped_at
+        self.reply_counts = reply_counts or {}
+        
+        # Filled during this run
+        self.started_at = time.time()
+        self.seen_counts = {}
+        self.seen_newest_pk = newest_pk
+        self.seen_newest_created_at = self.newest_created_at
+        self.complete = False
+        self.capped = False
+    
+    def is_known(self, comment_pk):
+        """True if the comment was collected by a previous run"""
+        return str(comment_pk) in self.reply_counts
+    
+    def replies_changed(self, comment_pk, child_count):
+        """True if a known comment's reply thread must be fetched again"""
+        return self.reply_counts.get(str(comment_pk)) != child_count
+    
+    def new_replies(self, comment_pk, child_count):
+        """Number of replies a known comment got since the previous run"""
+        return max(child_count - self.reply_counts.get(str(comment_pk), 0), 0)
+    
+    def observe(self, comment_dict):
+        """Record a top-level comment seen during this run"""
+        pk = str(comment_dict.get('pk', ''))
+        created_at = comment_dict.get('created_at', 0) or 0
+        self.seen_counts[pk] = comment_dict.get('child_comment_count', 0)
+        
+        if created_at > self.seen_newest_created_at:
+            self.seen_newest_created_at = created_at
+            self.seen_newest_pk = pk
+
+
+class IncrementalState:
+    """SQLite store of PostWatermark data, shared by all workers"""
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS watermarks (
+                shortcode TEXT PRIMARY KEY,
+                newest_pk TEXT,
+                newest_created_at INTEGER,
+                scraped_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS known_comments (
+                shortcode TEXT NOT NULL,
+                comment_pk TEXT NOT NULL,
+                reply_count INTEGER NOT NULL,
+                PRIMARY KEY (shortcode, comment_pk)
+            );
+        """)
+        self._conn.commit()
+    
+    def load(self, shortcode):
+        """Watermark of a post (empty if never scraped)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT newest_pk, newest_created_at, scraped_at FROM watermarks WHERE shortcode = ?",
+                (shortcode,)
+            ).fetchone()
+            if row is None:
+                return PostWatermark(shortcode)
+            
+            reply_counts = dict(self._conn.execute(
+                "SELECT comment_pk, reply_count FROM known_comments WHERE shortcode = ?",
+                (shortcode,)
+            ).fetchall())
+        
+        return PostWatermark(shortcode, row[0], row[1], row[2], reply_counts)
+    
+    def save(self, watermark):
+        """
+        Persist what was seen on a post
+        Also saved when pagination stopped at the comment cap (only the older tail is
+        missing); skipped when it failed, so the next run still fetches the rest
+        """
+        if not (watermark.complete or watermark.capped):
+            return False
+        
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?)",
+                (watermark.shortcode, watermark.seen_newest_pk,
+                 watermark.seen_newest_created_at, watermark.started_at)
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO known_comments VALUES (?, ?, ?)",
+                [(watermark.shortcode, pk, count) for pk, count in watermark.seen_counts.items()]
+            )
+            self._conn.commit()
+        
+        return True
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,102 @@
+"""
+Run Journal
+Append-only JSONL checkpoint of completed posts, used to resume interrupted batches
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from records import RecordBuffer
+
+# Rows encoded per write when a post is journaled
+ROW_CHUNK = 1000
+
+
+class RunJournal:
+    """
+    One JSON line per completed post: {"shortcode", "post", "comments", "likers"}
+    Each line is flushed and fsynced before record() returns, so a crash
+    loses at most the post being written.
+    """
+    
+    def __init__(self, path, resume=False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        
+        # A fresh run keeps the previous journal aside instead of overwriting it
+        if not resume and self.path.exists() and self.path.stat().st_size > 0:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            self.path.rename(self.path.with_name(f"{self.path.stem}_{timestamp}{self.path.suffix}"))
+        
+        self._file = open(self.path, 'a', encoding='utf-8')
+        
+        # A crash mid-write leaves a partial last line; start on a fresh one
+        if self._ends_with_partial_line():
+            self._file.write('\n')
+            self._file.flush()
+    
+    def _ends_with_partial_line(self):
+        if self.path.stat().st_size == 0:
+            return False
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b'\n'
+    
+    def entries(self):
+        """Yield (post_info, comments, likers) for every complete journal line"""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line truncated by a crash: that post will be scraped again
+                    continue
+                yield entry['post'], entry['comments'], entry['likers']
+    
+    @staticmethod
+    def _dumps(value):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    
+    def _write_rows(self, rows):
+        """
+        Write rows as a JSON array, ROW_CHUNK rows at a time
+        Buffers are read column by column; only one chunk of rows is encoded at once
+        """
+        self._file.write('[')
+        separator = ''
+        
+        if isinstance(rows, RecordBuffer):
+            keys = rows.KEYS
+            for start, stop in rows.iter_chunks(ROW_CHUNK):
+                columns = [rows.column(key, start, stop) for key in keys]
+                for values in zip(*columns):
+                    self._file.write(separator + self._dumps(dict(zip(keys, values))))
+                    separator = ', '
+        else:
+            for row in rows:
+                self._file.write(separator + self._dumps(dict(row)))
+                separator = ', '
+        
+        self._file.write(']')
+    
+    def record(self, post_info, comments, likers):
+        """
+        Append a completed post and force it to disk
+        The line is written in pieces (one row at a time), never built as a whole
+        """
+        with self._lock:
+            self._file.write(f'{{"shortcode": {self._dumps(post_info["shortcode"])}, '
+                             f'"post": {self._dumps(post_info)}, "comments": ')
+            self._write_rows(comments)
+            self._file.write(', "likers": ')
+            self._write_rows(likers)
+            self._file.write('}\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def close(self):
+        self._file.close()
@@ -0,0 +1,272 @@
+"""
+Run Metrics
+Per-endpoint call counts, error classes and latencies, plus time spent sleeping,
+exported as a Prometheus textfile during the run and a JSON summary at the end
+"""
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+import tracing
+from api_errors import classify_error
+
+# Latency histogram buckets (seconds)
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Latest latencies kept per endpoint for percentiles
+LATENCY_SAMPLES = 10000
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(q * len(sorted_values)))
+    return sorted_values[index]
+
+
+def _write_atomic(path, text):
+    """Replace path with text so readers never see a partial file"""
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+class EndpointStats:
+    """Counters and latency distribution of one endpoint"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = defaultdict(int)
+        self.bucket_counts = [0] * len(LATENCY_BUCKETS)
+        self.latency_sum = 0.0
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def observe(self, seconds, error_class=None):
+        self.calls += 1
+        if error_class:
+            self.errors[error_class] += 1
+        self.latency_sum += seconds
+        self.samples.append(seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def percentiles(self):
+        values = sorted(self.samples)
+        return {name: _percentile(values, q) for name, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))}
+
+
+class RunMetrics:
+    """
+    Thread-safe metrics of one scraper run
+
+    Network time is the sum of API call latencies over all workers; sleep time
+    is split by reason (rate_limit = waiting for the rate limiter, plus any
+    reason passed to sleep()).
+    """
+
+    def __init__(self, limiter=None, cache=None, hedging=None):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.endpoints = defaultdict(EndpointStats)
+        self.sleep_seconds = defaultdict(float)
+        self.limiter = limiter
+        self.cache = cache
+        self.hedging = hedging
+
+    def observe_call(self, endpoint, seconds, error=None):
+        """Record one API call (error=None for success)"""
+        error_class = classify_error(error) if error is not None else None
+        with self._lock:
+            self.endpoints[endpoint].observe(seconds, error_class)
+
+    def sleep(self, seconds, reason):
+        """time.sleep() that is accounted as sleep time"""
+        with tracing.span(reason, "sleep"):
+            time.sleep(seconds)
+        with self._lock:
+            self.sleep_seconds[reason] += seconds
+
+    def percentiles(self, endpoint):
+        """Observed p50/p95/p99 latency of an endpoint (None values before any call)"""
+        with self._lock:
+            return self.endpoints[endpoint].percentiles()
+
+    def p95(self, endpoint):
+        """(latency samples, p95 latency) of an endpoint, for the hedge policy"""
+        with self._lock:
+            stats = self.endpoints[endpoint]
+            return len(stats.samples), stats.percentiles()['p95']
+
+    def _sleep_totals(self):
+        totals = dict(self.sleep_seconds)
+        if self.limiter is not None:
+            totals['rate_limit'] = totals.get('rate_limit', 0.0) + self.limiter.total_wait
+            totals['token_cooldown'] = totals.get('token_cooldown', 0.0) + getattr(self.limiter, 'total_cooldown_wait', 0.0)
+        return totals
+
+    def summary(self):
+        """JSON-serialisable snapshot of every metric"""
+        with self._lock:
+            endpoints = {
+                name: {
+                    'calls': stats.calls,
+                    'errors': dict(stats.errors),
+                    'latency_seconds_total': round(stats.latency_sum, 3),
+                    'latency_seconds': {k: round(v, 4) if v is not None else None
+                                        for k, v in stats.percentiles().items()},
+                }
+                for name, stats in sorted(self.endpoints.items())
+            }
+            sleep = self._sleep_totals()
+
+        summary = {
+            'elapsed_seconds': round(time.time() - self.started, 3),
+            'api_calls': sum(e['calls'] for e in endpoints.values()),
+            'network_seconds': round(sum(e['latency_seconds_total'] for e in endpoints.values()), 3),
+            'sleep_seconds': {reason: round(seconds, 3) for reason, seconds in sorted(sleep.items())},
+            'endpoints': endpoints,
+        }
+        if self.cache is not None:
+            summary['cache'] = {'hits': self.cache.hits, 'misses': self.cache.misses}
+        if self.hedging is not None:
+            summary['hedging'] = {
+                'hedges': self.hedging.hedges, 'hedge_wins': self.hedging.hedge_wins,
+                'timeouts': self.hedging.timeouts,
+            }
+        return summary
+
+    def prometheus_text(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP hikerapi_requests_total API calls per endpoint",
+            "# TYPE hikerapi_requests_total counter",
+        ]
+        with self._lock:
+            endpoints = sorted(self.endpoints.items())
+            for name, stats in endpoints:
+                lines.append(f'hikerapi_requests_total{{endpoint="{name}"}} {stats.calls}')
+
+            lines += [
+                "# HELP hikerapi_errors_total Failed API calls per endpoint and error class",
+                "# TYPE hikerapi_errors_total counter",
+            ]
+            for name, stats in endpoints:
+                for error_class, count in sorted(stats.errors.items()):
+                    lines.append(f'hikerapi_errors_total{{endpoint="{name}",class="{error_class}"}} {count}')
+
+            lines += [
+                "# HELP hikerapi_request_duration_seconds API call latency",
+                "# TYPE hikerapi_request_duration_seconds histogram",
+            ]
+            for name, stats in endpoints:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.bucket_counts):
+                    cumulative += count
+                    lines.append(f'hikerapi_request_duration_seconds_bucket{{endpoint="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'hikerapi_request_duration_seconds_bucket{{endpoint="{name}",le="+Inf"}} {stats.calls}')
+                lines.append(f'hikerapi_request_duration_seconds_sum{{endpoint="{name}"}} {stats.latency_sum:.6f}')
+                lines.append(f'hikerapi_request_duration_seconds_count{{endpoint="{name}"}} {stats.calls}')
+
+            network = sum(stats.latency_sum for _, stats in endpoints)
+            sleep = self._sleep_totals()
+
+        lines += [
+            "# HELP scraper_network_seconds_total Time spent waiting on API calls, summed over workers",
+            "# TYPE scraper_network_seconds_total counter",
+            f"scraper_network_seconds_total {network:.6f}",
+            "# HELP scraper_sleep_seconds_total Time spent sleeping, by reason",
+            "# TYPE scraper_sleep_seconds_total counter",
+        ]
+        for reason, seconds in sorted(sleep.items()):
+            lines.append(f'scraper_sleep_seconds_total{{reason="{reason}"}} {seconds:.6f}')
+
+        if self.cache is not None:
+            lines += [
+                "# HELP scraper_cache_requests_total Response cache lookups",
+                "# TYPE scraper_cache_requests_total counter",
+                f'scraper_cache_requests_total{{result="hit"}} {self.cache.hits}',
+                f'scraper_cache_requests_total{{result="miss"}} {self.cache.misses}',
+            ]
+
+        if self.hedging is not None:
+            lines += [
+                "# HELP scraper_hedged_requests_total Duplicate calls sent for slow API calls, and how many answered first",
+                "# TYPE scraper_hedged_requests_total counter",
+                f'scraper_hedged_requests_total{{result="sent"}} {self.hedging.hedges}',
+                f'scraper_hedged_requests_total{{result="won"}} {self.hedging.hedge_wins}',
+                "# HELP scraper_timeouts_total API calls abandoned after their timeout",
+                "# TYPE scraper_timeouts_total counter",
+                f"scraper_timeouts_total {self.hedging.timeouts}",
+            ]
+
+        lines += [
+            "# HELP scraper_run_seconds Time since the run started",
+            "# TYPE scraper_run_seconds gauge",
+            f"scraper_run_seconds {time.time() - self.started:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        _write_atomic(Path(path), self.prometheus_text())
+
+    def write_summary(self, path):
+        _write_atomic(Path(path), json.dumps(self.summary(), indent=2))
+
+
+class MetricsExporter:
+    """Background thread rewriting the Prometheus textfile every `interval` seconds"""
+
+    def __init__(self, metrics, path, interval):
+        self.metrics = metrics
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.metrics.write_prometheus(self.path)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the thread and write the final values"""
+        self._stop.set()
+        self._thread.join()
+        self.metrics.write_prometheus(self.path)
+
+
+class InstrumentedClient:
+    """Wrap a HikerAPI client so every endpoint call is timed and counted"""
+
+    def __init__(self, client, metrics):
+        self._client = client
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with tracing.span(name, "api", **kwargs):
+                    result = attr(*args, **kwargs)
+            except Exception as e:
+                self.metrics.observe_call(name, time.perf_counter() - start, e)
+                raise
+            self.metrics.observe_call(name, time.perf_counter() - start)
+            return result
+
+        return call
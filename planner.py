@@ -0,0 +1,149 @@
+"""
+Scrape Planner
+Pre-pass that fetches media info for every URL, estimates the API calls and time
+each post will cost, and orders the batch by a scheduling policy
+"""
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Colors, print_header
+
+# Scheduling policies
+POLICIES = ("input", "cheapest", "largest", "fair")
+
+
+class PostPlan:
+    """Media info and estimated cost of one post"""
+
+    __slots__ = ('url', 'shortcode', 'post_info', 'media_id', 'calls')
+
+    def __init__(self, url, shortcode, post_info, media_id, calls):
+        self.url = url
+        self.shortcode = shortcode
+        self.post_info = post_info
+        self.media_id = media_id
+        self.calls = calls
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    @property
+    def media(self):
+        """(post_info, media_id) as returned by get_post_info, or None if it failed"""
+        return (self.post_info, self.media_id) if self.post_info else None
+
+
+def estimate_calls(total_comments, total_likes, max_comments=None, max_likers=None,
+                   comments_per_call=30, reply_thread_ratio=0.1, likers_per_call=50):
+    """
+    Estimated API calls per phase for a post with the given counts
+    Likers are paged (media_likers_chunk_gql) until max_likers
+    """
+    comments = min(total_comments, max_comments) if max_comments else total_comments
+    likers = min(total_likes, max_likers) if max_likers else total_likes
+    return {
+        'info': 1,
+        'comments': math.ceil(comments / comments_per_call) if comments else 0,
+        'replies': math.ceil(comments * reply_thread_ratio),
+        'likers': math.ceil(likers / likers_per_call) if likers else 0,
+    }
+
+
+def order_plans(plans, policy):
+    """Return plans in the order of the scheduling policy"""
+    if policy == "cheapest":
+        return sorted(plans, key=lambda plan: plan.total_calls)
+    if policy == "largest":
+        return sorted(plans, key=lambda plan: plan.total_calls, reverse=True)
+    if policy == "fair":
+        # Alternate small and large posts so neither clusters at one end of the run
+        by_cost = sorted(plans, key=lambda plan: plan.total_calls)
+        ordered = []
+        while by_cost:
+            ordered.append(by_cost.pop(0))
+            if by_cost:
+                ordered.append(by_cost.pop())
+        return ordered
+    return list(plans)
+
+
+def build_plan(urls, fetch_info, extract_shortcode, workers=1, pbar=None,
+               max_comments=None, max_likers=None, comments_per_call=30, reply_thread_ratio=0.1,
+               likers_per_call=50):
+    """
+    Fetch media info for every URL (fetch_info(url) -> (post_info, media_id)) and estimate its cost
+    Posts whose info could not be fetched get the average estimate of the others
+    """
+    def plan_one(url):
+        post_info, media_id = fetch_info(url)
+        calls = None
+        if post_info and media_id:
+            calls = estimate_calls(
+                post_info.get('total_comments') or 0, post_info.get('total_likes') or 0,
+                max_comments, max_likers, comments_per_call, reply_thread_ratio, likers_per_call
+            )
+        if pbar:
+            pbar.update(1)
+        return PostPlan(url, extract_shortcode(url), post_info, media_id, calls)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="plan-worker") as executor:
+        plans = list(executor.map(plan_one, urls))
+
+    known = [plan.calls for plan in plans if plan.calls]
+    for plan in plans:
+        if plan.calls is None:
+            plan.calls = {
+                phase: math.ceil(sum(calls[phase] for calls in known) / len(known)) if known else 1
+                for phase in ('info', 'comments', 'replies', 'likers')
+            }
+            # The info call is repeated when the post is scraped
+            plan.calls['info'] = 1
+
+    return plans
+
+
+def project_runtime(total_calls, rate, concurrency=1, latency=None):
+    """
+    Projected wall time in seconds: bounded by the request rate, or by latency
+    when too few workers are running to use the whole rate
+    """
+    by_rate = total_calls / rate if rate else 0.0
+    by_latency = total_calls * latency / max(1, concurrency) if latency else 0.0
+    return max(by_rate, by_latency)
+
+
+def format_duration(seconds):
+    """Human readable duration (e.g. 1h 05m, 4m 10s)"""
+    seconds = int(round(seconds))
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+def print_plan(plans, policy, rate, concurrency, latency=None, show=10):
+    """Print the schedule with its projected API-call budget and runtime"""
+    totals = {phase: sum(plan.calls[phase] for plan in plans) for phase in ('info', 'comments', 'replies', 'likers')}
+    # Media info of planned posts was fetched by the pre-pass
+    remaining = sum(totals.values()) - sum(1 for plan in plans if plan.post_info)
+
+    print_header("SCRAPE PLAN")
+    print(f"Policy: {Colors.BOLD}{policy}{Colors.RESET}")
+    print(f"Posts: {len(plans)} ({sum(1 for plan in plans if not plan.post_info)} without media info)")
+    print(f"API-call budget: {Colors.BOLD}{remaining:,}{Colors.RESET} "
+          f"(comments {totals['comments']:,}, replies {totals['replies']:,}, "
+          f"likers {totals['likers']:,}, info retries {totals['info'] - sum(1 for plan in plans if plan.post_info):,})")
+    print(f"Projected runtime: {Colors.BOLD}{format_duration(project_runtime(remaining, rate, concurrency, latency))}{Colors.RESET} "
+          f"at {rate:.2f} req/s, {concurrency} concurrent posts")
+
+    print(f"\n{'#':>4}  {'Shortcode':<14}{'Likes':>10}{'Comments':>10}{'API calls':>11}")
+    for i, plan in enumerate(plans[:show], 1):
+        likes = plan.post_info.get('total_likes', '') if plan.post_info else '?'
+        comments = plan.post_info.get('total_comments', '') if plan.post_info else '?'
+        print(f"{i:>4}  {plan.shortcode[:13]:<14}{likes:>10}{comments:>10}{plan.total_calls:>11}")
+    if len(plans) > show:
+        print(f"   ... {len(plans) - show} more")
+    print(f"{'='*70}\n")
@@ -0,0 +1,101 @@
+"""
+Adaptive Rate Limiter
+Token bucket shared by every HikerAPI call, with AIMD backoff on rate-limit errors
+"""
+
+import threading
+import time
+
+import tracing
+from api_errors import classify_error, RATE_LIMIT
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket with an adaptive refill rate (requests per second)
+    
+    The rate is cut multiplicatively when the API reports a rate limit and
+    raised additively again after a run of successful calls (AIMD).
+    Thread-safe: one instance is shared by all workers.
+    """
+    
+    def __init__(self, rate, min_rate, max_rate, burst=1,
+                 decrease_factor=0.5, increase_step=0.05, recovery_successes=10):
+        self._lock = threading.Lock()
+        self._rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.recovery_successes = recovery_successes
+        
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._successes = 0
+        
+        # Counters for reporting
+        self.total_requests = 0
+        self.total_rate_limits = 0
+        self.total_wait = 0.0
+    
+    @property
+    def current_rate(self):
+        """Current allowed rate (requests per second)"""
+        return self._rate
+    
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+    
+    def wait_time(self):
+        """Seconds until the next request may be sent (without taking a token)"""
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self._tokens) / self._rate)
+    
+    def acquire(self):
+        """Block until a request may be sent, returns the time spent waiting"""
+        waited = 0.0
+        
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.total_requests += 1
+                    self.total_wait += waited
+                    break
+                delay = (1 - self._tokens) / self._rate
+
+            time.sleep(delay)
+            waited += delay
+
+        tracing.record_wait("rate limit", waited)
+        return waited
+    
+    def on_success(self):
+        """Record a successful call (additive increase after a run of successes)"""
+        with self._lock:
+            self._successes += 1
+            if self._successes >= self.recovery_successes:
+                self._successes = 0
+                self._rate = min(self.max_rate, self._rate + self.increase_step)
+    
+    def on_rate_limit(self):
+        """Record a rate-limit error (multiplicative decrease, bucket emptied)"""
+        with self._lock:
+            self._refill()
+            self._successes = 0
+            self._rate = max(self.min_rate, self._rate * self.decrease_factor)
+            self._tokens = min(self._tokens, 0)
+            self.total_rate_limits += 1
+    
+    def report(self, error):
+        """Record the outcome of a call (error=None for success)"""
+        if error is None:
+            self.on_success()
+        elif classify_error(error) == RATE_LIMIT:
+            self.on_rate_limit()
+
@@ -0,0 +1,292 @@
+"""
+Compact Records
+Struct-of-arrays buffers for the comments and likers of one post
+
+Each buffer stores one column per field (array('q') for ids, counts and
+timestamps, bytearray for flags, UTF-8 blobs for unique strings, lists of
+interned strings for names repeated across rows) and keeps
+original_url/shortcode once. Iterating a buffer yields lightweight
+read-only views that behave like the previous row dicts (row['username'],
+row.get('parent_id'), dict(row)), so existing consumers keep working.
+"""
+
+import sys
+from array import array
+from collections.abc import Mapping
+from datetime import datetime
+
+# Stored for ids/counts that are missing or not numeric (read back as '')
+MISSING = -2**63
+
+# Flag values in bytearray columns
+FLAG_NONE = 2
+
+
+def _int_or_missing(value):
+    if value is None or value == '' or isinstance(value, bool):
+        return MISSING
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return MISSING
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def format_timestamp(created_at):
+    """Same date format as parse_comment"""
+    try:
+        return datetime.fromtimestamp(created_at).strftime('%Y-%m-%d %H:%M:%S') if created_at else ''
+    except (TypeError, ValueError, OverflowError, OSError):
+        return str(created_at)
+
+
+class StringColumn:
+    """
+    Strings stored back to back as UTF-8 in one bytearray, with their end offsets
+    About len(value) + 8 bytes per string instead of a str object (49+ bytes) and a pointer
+    """
+    
+    __slots__ = ('data', 'ends')
+    
+    def __init__(self):
+        self.data = bytearray()
+        self.ends = array('q')
+    
+    def append(self, value):
+        self.data += ('' if value is None else str(value)).encode('utf-8', 'surrogatepass')
+        self.ends.append(len(self.data))
+    
+    def extend(self, other):
+        """Append all strings of another StringColumn"""
+        base = len(self.data)
+        self.data += other.data
+        self.ends.extend(end + base for end in other.ends)
+    
+    def _start(self, index):
+        return self.ends[index - 1] if index else 0
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(len(self.ends))
+            part = StringColumn()
+            if stop > start:
+                offset = self._start(start)
+                part.data = self.data[offset:self.ends[stop - 1]]
+                part.ends = array('q', (end - offset for end in self.ends[start:stop]))
+            return part
+        if index < 0:
+            index += len(self.ends)
+        return self.data[self._start(index):self.ends[index]].decode('utf-8', 'surrogatepass')
+    
+    def __len__(self):
+        return len(self.ends)
+    
+    def __iter__(self):
+        data = self.data
+        start = 0
+        for end in self.ends:
+            yield data[start:end].decode('utf-8', 'surrogatepass')
+            start = end
+
+
+class RecordView(Mapping):
+    """Read-only dict-like view of one row of a buffer"""
+    
+    __slots__ = ('_buffer', '_index')
+    
+    def __init__(self, buffer, index):
+        self._buffer = buffer
+        self._index = index
+    
+    def __getitem__(self, key):
+        try:
+            getter = self._buffer.getters[key]
+        except KeyError:
+            raise KeyError(key) from None
+        return getter(self._index)
+    
+    def __iter__(self):
+        return iter(self._buffer.KEYS)
+    
+    def __len__(self):
+        return len(self._buffer.KEYS)
+    
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class RecordBuffer:
+    """
+    Base struct-of-arrays buffer
+    Subclasses list their row keys (KEYS) and how each stored field is kept.
+    """
+    
+    KEYS = ()
+    STRINGS = ()    # StringColumn (values mostly unique)
+    INTERNED = ()   # list of interned str (values repeated across rows and posts)
+    INTS = ()       # array('q'), read back as '' when missing
+    FLAGS = ()      # bytearray, read back as bool (or None)
+    
+    def __init__(self, original_url, shortcode):
+        self.original_url = _intern(original_url)
+        self.shortcode = _intern(shortcode)
+        self._length = 0
+        
+        self.columns = {}
+        for name in self.STRINGS:
+            self.columns[name] = StringColumn()
+        for name in self.INTERNED:
+            self.columns[name] = []
+        for name in self.INTS:
+            self.columns[name] = array('q')
+        for name in self.FLAGS:
+            self.columns[name] = bytearray()
+        
+        self.getters = {
+            'original_url': lambda i: self.original_url,
+            'shortcode': lambda i: self.shortcode,
+        }
+        for name in self.STRINGS + self.INTERNED:
+            self.getters[name] = self.columns[name].__getitem__
+        for name in self.INTS:
+            self.getters[name] = self._int_getter(self.columns[name])
+        for name in self.FLAGS:
+            self.getters[name] = self._flag_getter(self.columns[name])
+    
+    @staticmethod
+    def _int_getter(column):
+        def get(i):
+            value = column[i]
+            return '' if value == MISSING else value
+        return get
+    
+    @staticmethod
+    def _flag_getter(column):
+        def get(i):
+            value = column[i]
+            return None if value == FLAG_NONE else bool(value)
+        return get
+    
+    def append(self, row):
+        """Append a row given as a dict (or view) with the buffer's stored fields"""
+        columns = self.columns
+        for name in self.STRINGS:
+            columns[name].append(row.get(name, ''))
+        for name in self.INTERNED:
+            columns[name].append(_intern(row.get(name, '')))
+        for name in self.INTS:
+            columns[name].append(_int_or_missing(row.get(name)))
+        for name in self.FLAGS:
+            value = row.get(name)
+            columns[name].append(FLAG_NONE if value is None else int(bool(value)))
+        self._length += 1
+    
+    def extend(self, other, start=0, stop=None):
+        """Append rows start..stop of another buffer of the same type (column by column)"""
+        stop = len(other) if stop is None else stop
+        for name, column in self.columns.items():
+            column.extend(other.columns[name][start:stop])
+        self._length += max(0, stop - start)
+    
+    def column(self, key, start=0, stop=None):
+        """Values of one row key for rows start..stop, read column by column (no row views)"""
+        stop = self._length if stop is None else min(stop, self._length)
+        if key in ('original_url', 'shortcode'):
+            return [self.getters[key](0)] * max(0, stop - start)
+        if key in self.STRINGS:
+            return list(self.columns[key][start:stop])
+        if key in self.INTERNED:
+            return self.columns[key][start:stop]
+        if key in self.INTS:
+            return ['' if value == MISSING else value for value in self.columns[key][start:stop]]
+        if key in self.FLAGS:
+            return [None if value == FLAG_NONE else bool(value) for value in self.columns[key][start:stop]]
+        getter = self.getters[key]
+        return [getter(i) for i in range(start, stop)]
+    
+    def iter_chunks(self, size):
+        """Yield (start, stop) bounds covering all rows, at most `size` rows each"""
+        for start in range(0, self._length, size):
+            yield start, min(start + size, self._length)
+    
+    def __len__(self):
+        return self._length
+    
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return RecordView(self, index)
+    
+    def __iter__(self):
+        for i in range(self._length):
+            yield RecordView(self, i)
+    
+    def to_dicts(self):
+        """Plain row dicts (for JSON serialization)"""
+        return [dict(row) for row in self]
+
+
+class CommentBuffer(RecordBuffer):
+    """Comments and replies of one post (rows as returned by parse_comment)"""
+    
+    KEYS = (
+        'original_url', 'shortcode', 'type', 'parent_user', 'parent_id', 'username',
+        'full_name', 'user_id', 'text', 'date', 'created_at', 'likes', 'reply_count',
+        'comment_id', 'is_verified'
+    )
+    STRINGS = ('full_name', 'text')
+    INTERNED = ('parent_user', 'username')
+    INTS = ('parent_id', 'user_id', 'created_at', 'likes', 'reply_count', 'comment_id')
+    FLAGS = ('is_verified', 'is_reply')
+    
+    def __init__(self, original_url, shortcode):
+        super().__init__(original_url, shortcode)
+        # Row index -> created_at that is not a number (kept as given, rare)
+        self.raw_created_at = {}
+        
+        is_reply = self.columns['is_reply']
+        stored_created_at = self.getters['created_at']
+        
+        def created_at(i):
+            return self.raw_created_at[i] if i in self.raw_created_at else stored_created_at(i)
+        
+        self.getters['type'] = lambda i: 'reply' if is_reply[i] == 1 else 'comment'
+        self.getters['created_at'] = created_at
+        self.getters['date'] = lambda i: format_timestamp(created_at(i) or 0)
+        del self.getters['is_reply']
+    
+    def append(self, row):
+        row = dict(row)
+        row['is_reply'] = row.get('type') == 'reply'
+        created_at = row.get('created_at')
+        if created_at and not isinstance(created_at, (int, float)):
+            self.raw_created_at[len(self)] = created_at
+        super().append(row)
+    
+    def extend(self, other, start=0, stop=None):
+        stop = len(other) if stop is None else stop
+        offset = len(self) - start
+        for i, created_at in other.raw_created_at.items():
+            if start <= i < stop:
+                self.raw_created_at[i + offset] = created_at
+        super().extend(other, start, stop)
+    
+    def column(self, key, start=0, stop=None):
+        if key == 'created_at' and self.raw_created_at:
+            stop = len(self) if stop is None else min(stop, len(self))
+            return [self.getters[key](i) for i in range(start, stop)]
+        return super().column(key, start, stop)
+
+
+class LikerBuffer(RecordBuffer):
+    """Likers of one post (rows as yielded by iter_likers)"""
+    
+    KEYS = ('original_url', 'shortcode', 'username', 'full_name', 'user_id', 'is_verified', 'is_private')
+    STRINGS = ('username', 'full_name')
+    INTS = ('user_id',)
+    FLAGS = ('is_verified', 'is_private')
@@ -0,0 +1,162 @@
+"""
+Retry Engine
+Retries of failed API calls with capped exponential backoff and full jitter,
+behind a per-endpoint circuit breaker
+"""
+
+import random
+import threading
+import time
+
+import tracing
+from api_errors import classify_error, RATE_LIMIT, TRANSIENT
+
+# Error classes worth another attempt (auth, forbidden and not-found errors are final)
+RETRYABLE = (TRANSIENT, RATE_LIMIT)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an endpoint whose circuit is open"""
+
+
+class RetryPolicy:
+    """Attempts per call and capped exponential backoff with full jitter"""
+
+    def __init__(self, max_attempts=5, base_delay=1.0, max_delay=60.0, seed=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._random = random.Random(seed)
+
+    def delay(self, attempt):
+        """Seconds to wait after the given failed attempt (1 = first)"""
+        return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker of one endpoint
+
+    - closed: calls go through; failure_threshold transient failures in a row open it
+    - open: calls wait (or fail) until reset_timeout has passed
+    - half-open: a single probe call goes through; success closes the circuit,
+      failure opens it again
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self.times_opened = 0
+
+    def wait_time(self):
+        """
+        0 when the caller may send its call now (becoming the probe when half-open),
+        otherwise the seconds until the next probe may be attempted
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return 0.0
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+                return 0.0
+            # Half-open: another caller's probe is in flight
+            return max(remaining, 0.0) or min(1.0, self.reset_timeout)
+
+    def record(self, error_class):
+        """Record the outcome of a call that was let through (None for success)"""
+        with self._lock:
+            if error_class != TRANSIENT:
+                # Success, or an answer from the API (404, 429, ...): the endpoint is up
+                self.state = self.CLOSED
+                self._failures = 0
+                return
+
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    tracing.instant(f"circuit open {self.name}", "retry")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class RetryingClient:
+    """
+    Wrap a HikerAPI client so every endpoint call is retried on transient and
+    rate-limit errors, through one circuit breaker per endpoint
+
+    A retried call is sent again with the same arguments, so a paginated loop
+    resumes from the cursor of the failed page. sleep(seconds, reason) is used
+    for every wait (RunMetrics.sleep to account for it).
+    """
+
+    def __init__(self, client, policy, failure_threshold=5, reset_timeout=30.0, sleep=None):
+        self._client = client
+        self.policy = policy
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._sleep = sleep or (lambda seconds, reason: time.sleep(seconds))
+        self._lock = threading.Lock()
+        self.breakers = {}
+        self.retries = 0
+        self.recovered = 0
+        self.exhausted = 0
+
+    def breaker(self, endpoint):
+        with self._lock:
+            if endpoint not in self.breakers:
+                self.breakers[endpoint] = CircuitBreaker(endpoint, self.failure_threshold, self.reset_timeout)
+            return self.breakers[endpoint]
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            breaker = self.breaker(name)
+            attempt = 0
+
+            while True:
+                wait = breaker.wait_time()
+                if wait:
+                    # Circuit open: an attempt is spent waiting for the next probe
+                    attempt += 1
+                    if attempt >= self.policy.max_attempts:
+                        with self._lock:
+                            self.exhausted += 1
+                        raise CircuitOpenError(f"{name}: circuit open after repeated transient errors")
+                    self._sleep(wait, 'circuit_open')
+                    continue
+
+                attempt += 1
+                try:
+                    result = attr(*args, **kwargs)
+                except Exception as e:
+                    error_class = classify_error(e)
+                    breaker.record(error_class)
+                    if error_class not in RETRYABLE or attempt >= self.policy.max_attempts:
+                        if error_class in RETRYABLE:
+                            with self._lock:
+                                self.exhausted += 1
+                        raise
+                    with self._lock:
+                        self.retries += 1
+                    self._sleep(self.policy.delay(attempt), 'retry_backoff')
+                    continue
+
+                breaker.record(None)
+                if attempt > 1:
+                    with self._lock:
+                        self.recovered += 1
+                return result
+
+        return call
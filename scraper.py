@@ -4,21 +4,35 @@ Instagram Posts Batch Scraper
 Extract engagement data from multiple Instagram posts using HikerAPI
 """
 
-from hikerapi import Client
-import pandas as pd
 from datetime import datetime
 import time
-import random
 from tqdm import tqdm
+import os
 import sys
+import argparse
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 
 # Import configuration
 try:
+    import config
     from config import (
-        HIKERAPI_TOKEN, MAX_COMMENTS, MAX_LIKERS,
-        DELAY_BETWEEN_REQUESTS, DELAY_BETWEEN_POSTS, DELAY_AFTER_ERROR,
-        OUTPUT_DIRECTORY, OUTPUT_FILENAME,
+        HIKERAPI_TOKEN, HIKERAPI_TOKENS, TOKEN_COOLDOWN, TOKEN_MAX_COOLDOWN, TOKEN_RATE_LIMIT_STRIKES,
+        TOKEN_VALIDATION_TTL, TOKEN_VALIDATION_FILENAME,
+        MAX_COMMENTS, MAX_LIKERS,
+        REQUESTS_PER_SECOND, MIN_REQUESTS_PER_SECOND, MAX_REQUESTS_PER_SECOND,
+        RATE_LIMIT_BURST, RATE_DECREASE_FACTOR, RATE_INCREASE_STEP, RATE_RECOVERY_SUCCESSES,
+        RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT,
+        API_TIMEOUT, API_TIMEOUTS, HEDGE_ENABLED, HEDGE_BUDGET, HEDGE_MIN_SAMPLES,
+        MAX_CONCURRENT_POSTS, REPLY_WORKERS, REPLY_QUEUE_SIZE, HTTP_POOL_SIZE, HTTP2_ENABLED,
+        CACHE_ENABLED, CACHE_FILENAME, CACHE_MAX_MB, CACHE_TTL,
+        OUTPUT_DIRECTORY, OUTPUT_FILENAME, OUTPUT_FORMAT, JOURNAL_FILENAME,
+        INCREMENTAL_STATE_FILENAME, SCRAPED_INDEX_FILENAME, SKIP_SCRAPED_POSTS,
+        QUEUE_VISIBILITY_TIMEOUT, QUEUE_HEARTBEAT_INTERVAL, QUEUE_MAX_ATTEMPTS, QUEUE_POLL_INTERVAL,
+        METRICS_ENABLED, METRICS_FILENAME, METRICS_SUMMARY_FILENAME, METRICS_EXPORT_INTERVAL,
+        TRACE_FILENAME, PLAN_POLICY, PLAN_COMMENTS_PER_CALL, PLAN_REPLY_THREAD_RATIO, PLAN_LIKERS_PER_CALL,
+        DEADLINE_SAFETY_MARGIN, DEADLINE_MIN_COMMENTS,
         Colors, print_header, print_success, print_error, print_warning, print_info,
         validate_config
     )
@@ -26,18 +40,72 @@ except ImportError:
     print("[ERROR] config.py not found. Please ensure config.py is in the same directory.")
     sys.exit(1)
 
+from api_errors import classify_error, CheckedClient, AUTH, FORBIDDEN, RATE_LIMIT, NOT_FOUND
+from rate_limiter import AdaptiveRateLimiter
+from token_pool import TokenPool, PooledClient, TokenValidationCache
+from retry import RetryPolicy, RetryingClient
+from hedging import HedgePolicy, HedgedClient
+from http_pool import SharedHTTPPool
+from journal import RunJournal
+from api_cache import ResponseCache, CachedClient
+from incremental import IncrementalState
+from shortcodes import ScrapedIndex, canonical_shortcode, dedupe_urls
+from records import CommentBuffer, LikerBuffer
+from writers import open_writer
+import tracing
+from metrics import RunMetrics, MetricsExporter, InstrumentedClient
+from planner import POLICIES, build_plan, order_plans, print_plan, format_duration, project_runtime
+from deadline import DeadlineBudget, parse_duration
+from work_queue import WorkQueue, LeaseHeartbeat, merge_parts, default_worker_id
+
 # ============================================
 # UTILITIES
 # ============================================
 
-def random_sleep(min_sec, max_sec):
-    """Sleep for random duration"""
-    time.sleep(random.uniform(min_sec, max_sec))
+# Keep-alive connections shared by every HikerAPI client of the run
+http_pool = None
+
+
+def configure_http_pool():
+    """(Re)create the shared connection pool, sized to the configured concurrency"""
+    global http_pool
+    if http_pool:
+        http_pool.close()
+    
+    # In flight at once: the comment pager and reply workers of every post, doubled by hedging
+    size = HTTP_POOL_SIZE or MAX_CONCURRENT_POSTS * (max(1, REPLY_WORKERS) + 1) * (2 if HEDGE_ENABLED else 1)
+    http_pool = SharedHTTPPool(size, http2=HTTP2_ENABLED)
+    return http_pool
+
+
+def Client(*args, **kwargs):
+    """HikerAPI client on the shared connection pool (hikerapi and httpx are only imported when a client is needed)"""
+    return (http_pool or configure_http_pool()).client(*args, **kwargs)
+
+
+def last_http_status():
+    """HTTP status of the calling thread's last response on the shared pool"""
+    return http_pool.last_status() if http_pool else None
+
+
+def set_option(name, value):
+    """Override a config.py setting for this run (scraper globals and config module)"""
+    globals()[name] = value
+    setattr(config, name, value)
+
+
+def load_tokens_from_file(filepath):
+    """Load tokens from a text file (one per line, # comments ignored)"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
 
 
 def extract_shortcode(url):
-    """Extract shortcode from Instagram URL"""
-    return url.rstrip('/').split('/')[-1]
+    """Extract shortcode from Instagram URL (/p/, /reel/, /tv/, query strings ignored)"""
+    shortcode = canonical_shortcode(url)
+    if shortcode:
+        return shortcode
+    return url.split('?')[0].split('#')[0].rstrip('/').split('/')[-1]
 
 
 def load_urls_from_file(filepath):
@@ -101,35 +169,44 @@ def ask_for_urls():
         print_error("Invalid choice")
         return ask_for_urls()
 
-def validate_token_with_api(token):
+def validate_token_with_api(token, cache=None):
     """
     Validate HikerAPI token by making a test API call
+    With a TokenValidationCache, a recent successful validation is reused
     Returns (is_valid, error_message)
     """
+    age = cache.age(token) if cache else None
+    if age is not None:
+        print_success(f"Token is valid (checked {int(age // 60)} min ago)")
+        return True, None
+    
     try:
         print_info("Validating HikerAPI token...")
         
         # Try to create client and make a simple API call
-        test_client = Client(token=token)
+        test_client = CheckedClient(Client(token=token), status=last_http_status)
         
         # Test with a known public Instagram post
         test_shortcode = "CIN6J9yLRvy"  # Example post
         test_client.media_by_code_v1(test_shortcode)
         
         print_success("Token is valid")
+        if cache:
+            cache.store(token)
         return True, None
         
     except Exception as e:
         error_msg = str(e)
         
         # Check for common error types
-        if "401" in error_msg or "Unauthorized" in error_msg or "authentication" in error_msg.lower():
+        error_class = classify_error(e)
+        if error_class == AUTH:
             return False, "Invalid token - Authentication failed"
-        elif "403" in error_msg or "Forbidden" in error_msg:
+        elif error_class == FORBIDDEN:
             return False, "Token rejected - Access denied"
-        elif "429" in error_msg or "rate limit" in error_msg.lower():
+        elif error_class == RATE_LIMIT:
             return False, "Rate limit exceeded - Wait and try again"
-        elif "404" in error_msg:
+        elif error_class == NOT_FOUND:
             return False, "API endpoint not found - Token might be invalid"
         else:
             return False, f"Token validation failed: {error_msg[:100]}"
@@ -184,6 +261,18 @@ def prompt_for_token():
     
     return token
 
+# API endpoints used by the scraper (cached when CACHE_ENABLED)
+API_ENDPOINTS = (
+    'media_by_code_v1',
+    'comments_chunk_gql',
+    'comments_threaded_chunk_gql',
+    'media_likers_chunk_gql',
+)
+
+# comments_chunk_gql sort_order returning the newest comments first
+# (incremental runs stop at the first known comment, which relies on this order)
+COMMENTS_NEWEST_FIRST = 'recent'
+
 # ============================================
 # DATA EXTRACTION FUNCTIONS
 # ============================================
@@ -219,40 +308,80 @@ def get_post_info(cl, url, pbar=None):
         return None, None
 
 
-def get_all_likers(cl, media_id, url, max_likers=None, pbar=None):
-    """Retrieve users who liked the post"""
+def iter_liker_pages(cl, media_id):
+    """
+    Yield pages of raw liker dicts
+    media_likers_chunk_gql returns [likers, next_cursor]; the next page is only
+    requested when the consumer asks for it
+    """
+    end_cursor = None
+    seen_cursors = set()
+    
+    while True:
+        result = cl.media_likers_chunk_gql(media_id=str(media_id), end_cursor=end_cursor)
+        
+        if isinstance(result, list) and len(result) == 2:
+            likers_list, end_cursor = result
+        elif isinstance(result, dict):
+            likers_list = (result.get('response') or {}).get('items')
+            end_cursor = result.get('next_page_id')
+        else:
+            return
+        
+        if not isinstance(likers_list, list) or not likers_list:
+            return
+        yield likers_list
+        
+        # Last page, or the API sent the same cursor again
+        if not end_cursor or end_cursor in seen_cursors:
+            return
+        seen_cursors.add(end_cursor)
+
+
+def iter_likers(cl, media_id, url, max_likers=None):
+    """
+    Yield users who liked the post, one row at a time
+    Stops (and requests no further page) as soon as max_likers rows were yielded
+    """
     shortcode = extract_shortcode(url)
-    all_likers = []
+    count = 0
+    
+    for page in iter_liker_pages(cl, media_id):
+        for user in page:
+            if not isinstance(user, dict):
+                continue
+            
+            yield {
+                'original_url': url,
+                'shortcode': shortcode,
+                'username': user.get('username', ''),
+                'full_name': user.get('full_name', ''),
+                'user_id': user.get('pk', ''),
+                'is_verified': user.get('is_verified', False),
+                'is_private': user.get('is_private', False),
+            }
+            count += 1
+            
+            if max_likers and count >= max_likers:
+                return
+
+
+def get_all_likers(cl, media_id, url, max_likers=None, pbar=None):
+    """Retrieve users who liked the post (as a compact LikerBuffer)"""
+    all_likers = LikerBuffer(url, extract_shortcode(url))
     
     try:
-        likers_list = cl.media_likers_gql(media_id=str(media_id))
-        
-        if isinstance(likers_list, list):
-            for user in likers_list:
-                if isinstance(user, dict):
-                    all_likers.append({
-                        'original_url': url,
-                        'shortcode': shortcode,
-                        'username': user.get('username', ''),
-                        'full_name': user.get('full_name', ''),
-                        'user_id': user.get('pk', ''),
-                        'is_verified': user.get('is_verified', False),
-                        'is_private': user.get('is_private', False),
-                    })
-                    
-                    if max_likers and len(all_likers) >= max_likers:
-                        break
-        
-        random_sleep(*DELAY_BETWEEN_REQUESTS)
+        for liker in iter_likers(cl, media_id, url, max_likers):
+            all_likers.append(liker)
         
     except Exception as e:
         if pbar:
-            pbar.write(f"{Colors.YELLOW}[WARNING]{Colors.RESET} Likes ({shortcode}): {str(e)[:100]}")
+            pbar.write(f"{Colors.YELLOW}[WARNING]{Colors.RESET} Likes ({extract_shortcode(url)}): {str(e)[:100]}")
     
     return all_likers
 
 
-def parse_comment(comment_dict, url, is_reply=False, parent_username=''):
+def parse_comment(comment_dict, url, is_reply=False, parent_username='', parent_id=''):
     """Parse a comment dictionary"""
     shortcode = extract_shortcode(url)
     created_at = comment_dict.get('created_at', 0)
@@ -269,11 +398,13 @@ def parse_comment(comment_dict, url, is_reply=False, parent_username=''):
         'shortcode': shortcode,
         'type': 'reply' if is_reply else 'comment',
         'parent_user': parent_username if is_reply else '',
+        'parent_id': parent_id if is_reply else '',
         'username': user_data.get('username', ''),
         'full_name': user_data.get('full_name', '') or user_data.get('username', ''),
         'user_id': user_data.get('pk', '') or user_data.get('id', ''),
         'text': comment_dict.get('text', ''),
         'date': comment_date,
+        'created_at': created_at,
         'likes': comment_dict.get('comment_like_count', 0),
         'reply_count': comment_dict.get('child_comment_count', 0),
         'comment_id': comment_dict.get('pk', ''),
@@ -281,9 +412,15 @@ def parse_comment(comment_dict, url, is_reply=False, parent_username=''):
     }
 
 
-def get_comment_replies(cl, comment_id, media_id, comment_username, url, pbar=None):
-    """Retrieve replies to a comment"""
-    replies = []
+def get_comment_replies(cl, comment_id, media_id, comment_username, url, pbar=None, since=None):
+    """
+    Retrieve replies to a comment (only those created after `since` if given)
+    With `since`, the response cache is bypassed: a cached thread may predate the new replies
+    Returns a CommentBuffer
+    """
+    replies = CommentBuffer(url, extract_shortcode(url))
+    if since and isinstance(cl, CachedClient):
+        cl = cl.uncached
     
     try:
         end_cursor = None
@@ -301,14 +438,16 @@ def get_comment_replies(cl, comment_id, media_id, comment_username, url, pbar=No
             replies_found = 0
             
             for page in replies_data:
-                if isinstance(page, list):
-                    for reply_dict in page:
-                        if isinstance(reply_dict, dict):
-                            replies.append(parse_comment(reply_dict, url, is_reply=True, parent_username=comment_username))
-                            replies_found += 1
-                elif isinstance(page, dict):
-                    replies.append(parse_comment(page, url, is_reply=True, parent_username=comment_username))
-                    replies_found += 1
+                page_replies = page if isinstance(page, list) else [page]
+                for reply_dict in page_replies:
+                    if isinstance(reply_dict, dict):
+                        replies_found += 1
+                        if since and (reply_dict.get('created_at', 0) or 0) <= since:
+                            continue
+                        replies.append(parse_comment(
+                            reply_dict, url, is_reply=True,
+                            parent_username=comment_username, parent_id=comment_id
+                        ))
             
             if replies_found == 0:
                 break
@@ -324,91 +463,159 @@ def get_comment_replies(cl, comment_id, media_id, comment_username, url, pbar=No
             
             if not end_cursor:
                 break
-            
-            random_sleep(0.5, 1.0)
         
     except Exception as e:
-        pass  # Silent on reply errors
+        # Retries are exhausted: keep the replies collected so far
+        if pbar:
+            pbar.write(f"{Colors.YELLOW}[WARNING]{Colors.RESET} Replies ({extract_shortcode(url)}, comment {comment_id}): "
+                       f"{len(replies)} kept, {str(e)[:100]}")
     
     return replies
 
 
-def get_all_comments_with_replies(cl, media_id, url, max_comments=None, pbar=None):
-    """Retrieve all comments and replies"""
-    all_comments = []
+def get_all_comments_with_replies(cl, media_id, url, max_comments=None, pbar=None, watermark=None):
+    """
+    Retrieve all comments and replies
+    With a watermark (incremental mode), only comments and replies not seen by
+    the previous run are returned, and pagination stops at already-known comments
+    
+    Reply threads are fetched by a pool of REPLY_WORKERS threads while top-level
+    pagination continues; at most REPLY_QUEUE_SIZE threads wait in the queue.
+    Replies are placed right after their parent comment in the returned CommentBuffer.
+    """
+    comments = CommentBuffer(url, extract_shortcode(url))
+    # (position in comments, reply buffer or future of one) for every reply thread
+    threads = []
+    # Comments collected so far (reply threads counted by their announced size)
+    collected = 0
+    finished = False
+    capped = False
+    
+    reply_pool = ThreadPoolExecutor(max_workers=REPLY_WORKERS, thread_name_prefix="reply-worker") if REPLY_WORKERS > 1 else None
+    queue_slots = threading.BoundedSemaphore(REPLY_QUEUE_SIZE)
+    
+    def fetch_replies(*args, **kwargs):
+        try:
+            with tracing.span("reply thread", "replies", comment_id=args[1]):
+                return get_comment_replies(*args, **kwargs)
+        finally:
+            queue_slots.release()
+    
+    # Only incremental runs ask for an explicit order: other calls keep their cache keys
+    sort_params = {'sort_order': COMMENTS_NEWEST_FIRST} if watermark else {}
     
     try:
-        end_cursor = None
-        
-        while True:
-            result = cl.comments_chunk_gql(
-                media_id=str(media_id),
-                end_cursor=end_cursor
-            )
-            
-            if not result or not isinstance(result, list):
-                break
-            
-            comments_found = 0
+        try:
+            end_cursor = None
             
-            for page_comments in result:
-                if not isinstance(page_comments, list):
-                    continue
+            while True:
+                result = cl.comments_chunk_gql(
+                    media_id=str(media_id),
+                    end_cursor=end_cursor,
+                    **sort_params
+                )
+                
+                if not result or not isinstance(result, list):
+                    finished = True
+                    break
+                
+                comments_found = 0
+                reached_known = False
                 
-                for comment_dict in page_comments:
-                    if not isinstance(comment_dict, dict):
+                for page_comments in result:
+                    if not isinstance(page_comments, list):
                         continue
                     
-                    comment = parse_comment(comment_dict, url, is_reply=False)
-                    all_comments.append(comment)
-                    comments_found += 1
-                    
-                    # Get replies
-                    child_count = comment_dict.get('child_comment_count', 0)
-                    if child_count > 0:
-                        replies = get_comment_replies(
-                            cl, 
-                            comment_dict.get('pk'),
-                            media_id,
-                            comment['username'],
-                            url,
-                            pbar
-                        )
+                    for comment_dict in page_comments:
+                        if not isinstance(comment_dict, dict):
+                            continue
+                        
+                        comments_found += 1
+                        comment_pk = comment_dict.get('pk')
+                        username = comment_dict.get('user', {}).get('username', '')
+                        child_count = comment_dict.get('child_comment_count', 0)
+                        
+                        # Incremental mode: known comments are not returned again
+                        known = watermark is not None and watermark.is_known(comment_pk)
+                        if watermark:
+                            watermark.observe(comment_dict)
+                        
+                        if known:
+                            reached_known = True
+                        else:
+                            comments.append(parse_comment(comment_dict, url, is_reply=False))
+                            collected += 1
                         
-                        if replies:
-                            all_comments.extend(replies)
+                        # Get replies (for known comments only if the thread changed)
+                        if child_count > 0 and (not known or watermark.replies_changed(comment_pk, child_count)):
+                            reply_args = (cl, comment_pk, media_id, username, url, pbar)
+                            since = watermark.scraped_at if known else None
+                            
+                            if reply_pool:
+                                # Blocks only when the reply queue is full
+                                queue_slots.acquire()
+                                replies = reply_pool.submit(fetch_replies, *reply_args, since=since)
+                            else:
+                                replies = get_comment_replies(*reply_args, since=since)
+                            threads.append((len(comments), replies))
+                            # Known threads only return the replies added since the previous run
+                            collected += watermark.new_replies(comment_pk, child_count) if known else child_count
                         
-                        random_sleep(0.8, 1.5)
+                        if max_comments and collected >= max_comments:
+                            capped = True
+                            break
                     
-                    if max_comments and len(all_comments) >= max_comments:
+                    if capped:
                         break
                 
-                if max_comments and len(all_comments) >= max_comments:
+                if comments_found == 0 or reached_known:
+                    finished = True
+                    break
+                
+                if capped:
+                    break
+                
+                if len(result) < 2:
+                    finished = True
+                    break
+                
+                last_page = result[-1] if result else []
+                if last_page and isinstance(last_page, list) and len(last_page) > 0:
+                    last_comment = last_page[-1]
+                    if isinstance(last_comment, dict):
+                        end_cursor = last_comment.get('pk', None)
+                
+                if not end_cursor:
+                    finished = True
                     break
             
-            if comments_found == 0:
-                break
-            
-            if max_comments and len(all_comments) >= max_comments:
-                break
-            
-            if len(result) < 2:
-                break
-            
-            random_sleep(*DELAY_BETWEEN_REQUESTS)
-            
-            last_page = result[-1] if result else []
-            if last_page and isinstance(last_page, list) and len(last_page) > 0:
-                last_comment = last_page[-1]
-                if isinstance(last_comment, dict):
-                    end_cursor = last_comment.get('pk', None)
-            
-            if not end_cursor:
-                break
+        except Exception as e:
+            # Retries are exhausted: keep the comments collected so far
+            if pbar:
+                pbar.write(f"{Colors.YELLOW}[WARNING]{Colors.RESET} Comments ({extract_shortcode(url)}): "
+                           f"stopped after {len(comments)} comments, {str(e)[:100]}")
         
-    except Exception as e:
-        if pbar:
-            pbar.write(f"{Colors.YELLOW}[WARNING]{Colors.RESET} Comments ({extract_shortcode(url)}): {str(e)[:100]}")
+        if pbar and reply_pool:
+            pbar.set_description(f"{Colors.CYAN}Post {extract_shortcode(url)[:8]}... - Replies{Colors.RESET}")
+        
+        # Wait for the reply threads and attach them after their parent comment
+        all_comments = CommentBuffer(url, extract_shortcode(url))
+        start = 0
+        with tracing.span("replies", "phase", shortcode=extract_shortcode(url), threads=len(threads)):
+            for position, replies in threads:
+                all_comments.extend(comments, start, position)
+                all_comments.extend(replies if isinstance(replies, CommentBuffer) else replies.result())
+                start = position
+            all_comments.extend(comments, start)
+        
+    finally:
+        # Also on Ctrl+C: queued reply fetches are dropped, running ones finish
+        if reply_pool:
+            reply_pool.shutdown(wait=False, cancel_futures=True)
+    
+    if watermark:
+        watermark.complete = finished
+        watermark.capped = capped
     
     return all_comments
 
@@ -417,230 +624,736 @@ def get_all_comments_with_replies(cl, media_id, url, max_comments=None, pbar=Non
 # POST PROCESSING
 # ============================================
 
-def process_single_post(cl, url, pbar=None):
-    """Process a single Instagram post"""
+def process_single_post(cl, url, pbar=None, state=None, media=None):
+    """
+    Process a single Instagram post
+    With an IncrementalState, only comments newer than the previous run are collected
+    media: (post_info, media_id) already fetched by the planner, skips the info call
+    """
     shortcode = extract_shortcode(url)
     
-    if pbar:
-        pbar.set_description(f"{Colors.CYAN}Post {shortcode[:8]}... - Info{Colors.RESET}")
-    
-    # 1. Post info
-    post_info, media_id = get_post_info(cl, url, pbar)
-    if not post_info or not media_id:
+    with tracing.span(f"post {shortcode}", "post", url=url):
         if pbar:
-            pbar.write(f"{Colors.RED}[FAILED]{Colors.RESET} {shortcode}")
-        return None, [], []
-    
-    random_sleep(*DELAY_BETWEEN_REQUESTS)
+            pbar.set_description(f"{Colors.CYAN}Post {shortcode[:8]}... - Info{Colors.RESET}")
+        
+        # 1. Post info
+        with tracing.span("info", "phase", shortcode=shortcode):
+            post_info, media_id = media or get_post_info(cl, url, pbar)
+        if not post_info or not media_id:
+            if pbar:
+                pbar.write(f"{Colors.RED}[FAILED]{Colors.RESET} {shortcode}")
+            return None, [], []
+        
+        # 2. Comments
+        if pbar:
+            pbar.set_description(f"{Colors.CYAN}Post {shortcode[:8]}... - Comments{Colors.RESET}")
+        
+        watermark = state.load(shortcode) if state else None
+        with tracing.span("comments", "phase", shortcode=shortcode):
+            comments = get_all_comments_with_replies(cl, media_id, url, MAX_COMMENTS, pbar, watermark)
+        
+        # 3. Likes
+        if pbar:
+            pbar.set_description(f"{Colors.CYAN}Post {shortcode[:8]}... - Likes{Colors.RESET}")
+        
+        with tracing.span("likes", "phase", shortcode=shortcode):
+            likers = get_all_likers(cl, media_id, url, MAX_LIKERS, pbar)
+        
+        # Statistics
+        main_comments = [c for c in comments if c['type'] == 'comment']
+        replies = [c for c in comments if c['type'] == 'reply']
+        
+        if pbar:
+            pbar.write(f"{Colors.GREEN}[OK]{Colors.RESET} {shortcode[:10]}: {len(main_comments)}+{len(replies)} comments, {len(likers)} likes")
+        
+        if state:
+            state.save(watermark)
+        
+        return post_info, comments, likers
+
+
+def show_rate(pbar, limiter):
+    """Display the current adaptive request rate next to the progress bar"""
+    if limiter:
+        pbar.set_postfix_str(f"{limiter.current_rate:.2f} req/s")
+
+
+def process_posts_concurrently(cl, urls, max_workers, pbar, limiter=None, on_complete=None, state=None, prefetched=None):
+    """
+    Process posts with a bounded pool of worker threads
+    Yields one result per URL, in the same order as urls (None if the post crashed)
+    At most 2 * max_workers posts are in flight or waiting for an earlier URL
+    on_complete(result) is called as soon as each post completes
+    On Ctrl+C, completed posts still waiting for an earlier URL are yielded before stopping
+    prefetched: {url: (post_info, media_id)} from the planner
+    """
+    prefetched = prefetched or {}
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="post-worker")
+    futures = {}
     
-    # 2. Comments
-    if pbar:
-        pbar.set_description(f"{Colors.CYAN}Post {shortcode[:8]}... - Comments{Colors.RESET}")
+    # Completed posts waiting for an earlier URL to finish
+    pending = {}
+    next_index = 0
     
-    comments = get_all_comments_with_replies(cl, media_id, url, MAX_COMMENTS, pbar)
+    # URLs are submitted at most `window` ahead of the next one to yield, so a slow
+    # post holds back a bounded number of completed results
+    window = 2 * max_workers
+    submitted = 0
     
-    random_sleep(*DELAY_BETWEEN_REQUESTS)
+    def submit_ready():
+        nonlocal submitted
+        while submitted < len(urls) and submitted < next_index + window:
+            url = urls[submitted]
+            futures[executor.submit(process_single_post, cl, url, pbar, state, prefetched.get(url))] = submitted
+            submitted += 1
     
-    # 3. Likes
-    if pbar:
-        pbar.set_description(f"{Colors.CYAN}Post {shortcode[:8]}... - Likes{Colors.RESET}")
+    try:
+        submit_ready()
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures.pop(future)
+                try:
+                    pending[i] = future.result()
+                    if on_complete:
+                        on_complete(pending[i])
+                except Exception as e:
+                    pending[i] = None
+                    pbar.write(f"{Colors.RED}[ERROR]{Colors.RESET} Critical error on {urls[i]}: {e}")
+                pbar.update(1)
+                show_rate(pbar, limiter)
+            
+            while next_index in pending:
+                yield pending.pop(next_index)
+                next_index += 1
+            submit_ready()
+    except KeyboardInterrupt:
+        pbar.write(f"\n{Colors.YELLOW}[INTERRUPTED]{Colors.RESET} Manual stop (Ctrl+C), writing completed posts")
+        # Posts already journaled but still waiting for an earlier URL
+        for i in sorted(pending):
+            yield pending.pop(i)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def process_posts_with_deadline(cl, plans, budget, max_workers, pbar, limiter=None, state=None):
+    """
+    Scrape planned posts phase by phase within a DeadlineBudget
+    Every post already has its info (planner pre-pass); comments are then collected
+    for all posts with caps recomputed from the time left, and likers last.
+    Yields (post_info, comments, likers) in plan order once the likers phase reaches each post.
+    """
+    posts = [plan for plan in plans if plan.post_info]
+    comments = {}
+    finished = 0
+    lock = threading.Lock()
     
-    likers = get_all_likers(cl, media_id, url, MAX_LIKERS, pbar)
+    def collect_comments(plan):
+        nonlocal finished
+        with lock:
+            # Posts still collecting share the time left with those not started yet;
+            # one likers call per post is kept aside for the last phase
+            cap = budget.comment_cap(len(posts) - finished, reserved_calls=len(posts), max_comments=MAX_COMMENTS)
+        
+        if cap:
+            watermark = state.load(plan.shortcode) if state else None
+            with tracing.span("comments", "phase", shortcode=plan.shortcode, cap=cap):
+                result = get_all_comments_with_replies(cl, plan.media_id, plan.url, cap, pbar, watermark)
+            if state:
+                state.save(watermark)
+        else:
+            result = CommentBuffer(plan.url, plan.shortcode)
+        
+        budget.observe_comments(len(result))
+        comments[plan.url] = result
+        with lock:
+            finished += 1
+        pbar.update(1)
+        show_rate(pbar, limiter)
     
-    # Statistics
-    main_comments = [c for c in comments if c['type'] == 'comment']
-    replies = [c for c in comments if c['type'] == 'reply']
+    def collect_likers(plan):
+        if budget.expired():
+            likers = LikerBuffer(plan.url, plan.shortcode)
+        else:
+            with tracing.span("likes", "phase", shortcode=plan.shortcode):
+                likers = get_all_likers(cl, plan.media_id, plan.url, MAX_LIKERS, pbar)
+        
+        post_comments = comments.pop(plan.url)
+        replies = sum(1 for c in post_comments if c['type'] == 'reply')
+        pbar.write(f"{Colors.GREEN}[OK]{Colors.RESET} {plan.shortcode[:10]}: "
+                   f"{len(post_comments) - replies}+{replies} comments, {len(likers)} likes")
+        pbar.update(1)
+        show_rate(pbar, limiter)
+        return plan.post_info, post_comments, likers
     
-    if pbar:
-        pbar.write(f"{Colors.GREEN}[OK]{Colors.RESET} {shortcode[:10]}: {len(main_comments)}+{len(replies)} comments, {len(likers)} likes")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="post-worker") as executor:
+        pbar.reset(total=len(posts))
+        pbar.set_description(f"{Colors.CYAN}Comments{Colors.RESET}")
+        budget.start_comments()
+        list(executor.map(collect_comments, posts))
+        
+        pbar.reset(total=len(posts))
+        pbar.set_description(f"{Colors.CYAN}Likes{Colors.RESET}")
+        yield from executor.map(collect_likers, posts)
+
+
+def process_queue(cl, queue, worker, max_workers, pbar, limiter=None, on_complete=None, state=None, metrics=None):
+    """
+    Lease posts from a shared WorkQueue and process them until the queue is drained
+    Yields results as posts complete. on_complete(result) must persist the post
+    before it is marked done; failed posts go back to the queue.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="post-worker")
+    running = {}
     
-    return post_info, comments, likers
+    try:
+        with LeaseHeartbeat(queue, worker, QUEUE_HEARTBEAT_INTERVAL):
+            while True:
+                # Keep every worker thread busy with a leased post
+                if len(running) < max_workers:
+                    for shortcode, url, lease_id in queue.lease(worker, max_workers - len(running)):
+                        future = executor.submit(process_single_post, cl, url, pbar, state)
+                        running[future] = (shortcode, url, lease_id)
+                
+                if not running:
+                    if queue.is_drained():
+                        break
+                    # Other hosts still hold leases: wait in case one of them expires
+                    if metrics:
+                        metrics.sleep(QUEUE_POLL_INTERVAL, 'queue_poll')
+                    else:
+                        time.sleep(QUEUE_POLL_INTERVAL)
+                    continue
+                
+                future = next(as_completed(running))
+                shortcode, url, lease_id = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = None
+                    pbar.write(f"{Colors.RED}[ERROR]{Colors.RESET} Critical error on {url}: {e}")
+                
+                if result and result[0]:
+                    if on_complete:
+                        on_complete(result)
+                    queue.complete(shortcode, worker)
+                else:
+                    queue.release(shortcode, lease_id, "post could not be scraped")
+                
+                if pbar.total is not None and pbar.n >= pbar.total:
+                    pbar.total = pbar.n + 1
+                pbar.update(1)
+                show_rate(pbar, limiter)
+                yield result
+    except KeyboardInterrupt:
+        pbar.write(f"\n{Colors.YELLOW}[INTERRUPTED]{Colors.RESET} Manual stop (Ctrl+C), leases will expire")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 # ============================================
-# SAVE RESULTS
+# MAIN FUNCTION
 # ============================================
 
-def save_results(all_posts_info, all_comments, all_likers, output_dir, output_filename):
-    """Save all data to a single CSV file"""
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return number
+
+
+def parse_args():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(
+        description="Instagram Posts Batch Scraper",
+        epilog="Options not given on the command line are read from config.py. "
+               "Tokens are taken from --token-file, else the HIKERAPI_TOKEN environment "
+               "variable (comma-separated for several), else config.py."
+    )
     
-    # Create output directory
-    output_path = Path(output_dir)
-    output_path.mkdir(parents=True, exist_ok=True)
-    
-    filename = output_path / f"{output_filename.replace('.csv', '')}_{timestamp}.csv"
-    
-    print_info("Saving data...")
-    
-    # Create unified data list
-    all_data = []
-    
-    # 1. Add posts
-    for post in all_posts_info:
-        row = post.copy()
-        row['data_type'] = 'POST'
-        row['data_user'] = post['author']
-        row['data_text'] = post['caption']
-        row['data_date'] = post['publication_date']
-        all_data.append(row)
-    
-    # 2. Add comments
-    for comment in all_comments:
-        row = {
-            'original_url': comment['original_url'],
-            'shortcode': comment['shortcode'],
-            'data_type': comment['type'].upper(),  # 'COMMENT' or 'REPLY'
-            'data_user': comment['username'],
-            'data_full_name': comment['full_name'],
-            'data_user_id': comment['user_id'],
-            'data_text': comment['text'],
-            'data_date': comment['date'],
-            'data_likes': comment['likes'],
-            'data_is_verified': comment['is_verified'],
-            'parent_user': comment['parent_user'],
-            'comment_id': comment['comment_id'],
-            'reply_count': comment['reply_count']
-        }
-        all_data.append(row)
-    
-    # 3. Add likes
-    for liker in all_likers:
-        row = {
-            'original_url': liker['original_url'],
-            'shortcode': liker['shortcode'],
-            'data_type': 'LIKE',
-            'data_user': liker['username'],
-            'data_full_name': liker['full_name'],
-            'data_user_id': liker['user_id'],
-            'data_is_verified': liker['is_verified'],
-            'data_is_private': liker['is_private']
-        }
-        all_data.append(row)
+    run = parser.add_argument_group("input and output (override config.py)")
+    run.add_argument(
+        '--input', '-i', metavar='FILE', nargs='+',
+        help="URL files to scrape: .txt (one URL per line) or .py (POST_URLS list)"
+    )
+    run.add_argument('--format', choices=("csv", "parquet", "sqlite"), help="output format (OUTPUT_FORMAT)")
+    run.add_argument('--output-dir', metavar='DIR', help="output directory (OUTPUT_DIRECTORY)")
+    run.add_argument('--max-comments', type=positive_int, metavar='N', help="comments per post (MAX_COMMENTS)")
+    run.add_argument('--max-likers', type=positive_int, metavar='N', help="likers per post (MAX_LIKERS)")
+    run.add_argument('--concurrency', type=positive_int, metavar='N', help="posts processed at once (MAX_CONCURRENT_POSTS)")
+    run.add_argument('--token-file', metavar='FILE', help="HikerAPI tokens, one per line (the first is the main token)")
+    run.add_argument(
+        '--non-interactive', action='store_true',
+        help="never prompt: fail instead of asking for a token or URLs (default when stdin is not a terminal)"
+    )
+    run.add_argument(
+        '--skip-token-check', action='store_true',
+        help="do not validate tokens with a test request before starting"
+    )
     
-    # Save CSV
-    try:
-        df_all = pd.DataFrame(all_data)
-        
-        # Reorder columns (original_url first)
-        cols = df_all.columns.tolist()
-        if 'original_url' in cols:
-            cols.remove('original_url')
-            cols = ['original_url'] + cols
-            df_all = df_all[cols]
-        
-        df_all.to_csv(filename, index=False, encoding='utf-8-sig')
-        
-        print_success(f"File saved: {filename}")
-        print(f"  Total rows: {len(df_all):,}")
-        print(f"  Posts: {len(all_posts_info)}")
-        print(f"  Comments/Replies: {len(all_comments)}")
-        print(f"  Likes: {len(all_likers)}")
-        
-        return filename
-        
-    except Exception as e:
-        print_error(f"Save error: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+    parser.add_argument(
+        '--resume', action='store_true',
+        help="continue an interrupted batch: skip posts already in the run journal"
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="only collect comments and replies added since the previous run of each post"
+    )
+    parser.add_argument(
+        '--rescrape', action='store_true',
+        help="scrape posts again even if a previous run already did (see SKIP_SCRAPED_POSTS)"
+    )
+    parser.add_argument(
+        '--plan', action='store_true',
+        help="fetch media info of every post first, then schedule posts by estimated cost"
+    )
+    parser.add_argument(
+        '--plan-only', action='store_true',
+        help="print the plan (order, API-call budget, projected runtime) and exit without scraping"
+    )
+    parser.add_argument(
+        '--policy', choices=POLICIES, default=None,
+        help=f"scheduling policy for --plan (default: PLAN_POLICY = {PLAN_POLICY})"
+    )
+    parser.add_argument(
+        '--deadline', metavar='DURATION', type=parse_duration,
+        help="finish within this time (e.g. 2h, 90m): info for all posts, then comments, then likers, "
+             "with per-post caps adapted to the observed throughput (implies --plan)"
+    )
+    parser.add_argument(
+        '--trace', action='store_true',
+        help="record a timeline of posts, phases, API calls and sleeps (Chrome trace JSON)"
+    )
+    
+    queue = parser.add_argument_group("shared work queue (several hosts)")
+    queue.add_argument(
+        '--queue', metavar='PATH',
+        help="work as a queue worker: lease posts from this SQLite queue (on shared storage)"
+    )
+    queue.add_argument(
+        '--enqueue', metavar='FILE',
+        help="add the URLs of FILE to the queue and exit"
+    )
+    queue.add_argument(
+        '--merge', action='store_true',
+        help="combine the partial outputs of all workers into one output and exit"
+    )
+    args = parser.parse_args()
+    args.interactive = sys.stdin.isatty() and not args.non_interactive
+    if (args.enqueue or args.merge) and not args.queue:
+        parser.error("--enqueue and --merge require --queue")
+    if args.deadline is not None and args.queue:
+        parser.error("--deadline cannot be combined with --queue")
+    return args
 
 
-# ============================================
-# MAIN FUNCTION
-# ============================================
+def apply_cli_options(args):
+    """Apply command line overrides and the token source on top of config.py"""
+    for option, name in (('format', 'OUTPUT_FORMAT'), ('output_dir', 'OUTPUT_DIRECTORY'),
+                         ('max_comments', 'MAX_COMMENTS'), ('max_likers', 'MAX_LIKERS'),
+                         ('concurrency', 'MAX_CONCURRENT_POSTS')):
+        value = getattr(args, option)
+        if value is not None:
+            set_option(name, value)
+    
+    if args.token_file:
+        try:
+            tokens = load_tokens_from_file(args.token_file)
+        except OSError as e:
+            print_error(f"Cannot read token file: {e}")
+            sys.exit(1)
+    else:
+        tokens = [token.strip() for token in os.environ.get('HIKERAPI_TOKEN', '').split(',') if token.strip()]
+    
+    if tokens:
+        set_option('HIKERAPI_TOKEN', tokens[0])
+        set_option('HIKERAPI_TOKENS', tokens[1:])
+
+
+def run_queue_command(args):
+    """Coordinator side of the work queue: --enqueue and --merge"""
+    queue = WorkQueue(args.queue, QUEUE_VISIBILITY_TIMEOUT, QUEUE_MAX_ATTEMPTS)
+    
+    if args.enqueue:
+        urls = load_urls_from_file(args.enqueue)
+        index = ScrapedIndex(Path(OUTPUT_DIRECTORY) / SCRAPED_INDEX_FILENAME)
+        urls, duplicates, scraped = dedupe_urls(urls, index if SKIP_SCRAPED_POSTS and not args.rescrape else None)
+        index.close()
+        added = queue.enqueue((extract_shortcode(url), url) for url in urls)
+        print_success(f"Queued {added} new posts ({len(urls) - added} already in queue, "
+                      f"{duplicates} duplicate URLs, {scraped} already scraped)")
+    
+    if args.merge:
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        try:
+            writer = open_writer(OUTPUT_FORMAT, OUTPUT_DIRECTORY, OUTPUT_FILENAME, timestamp)
+        except ImportError as e:
+            print_error(str(e))
+            sys.exit(1)
+        
+        print_info(f"Merging partial outputs from {queue.parts_dir}...")
+        written = merge_parts(queue, writer)
+        writer.close()
+        print_success(f"File saved: {writer.path}")
+        print(f"  Posts: {written}, comments: {writer.comments}, likes: {writer.likers}")
+    
+    counts = queue.counts()
+    print(f"Queue: {counts['pending']} pending, {counts['leased']} leased, "
+          f"{counts['done']} done, {counts['failed']} failed")
+    queue.close()
+
 
 def main():
     """Main execution function"""
+    args = parse_args()
+    apply_cli_options(args)
+    configure_http_pool()
+    
     print_header("INSTAGRAM BATCH SCRAPER")
     
+    if args.enqueue or args.merge:
+        run_queue_command(args)
+        return
+    
     # Check token configuration
-    global HIKERAPI_TOKEN
+    validation_cache = None
+    if TOKEN_VALIDATION_TTL:
+        validation_cache = TokenValidationCache(Path(OUTPUT_DIRECTORY) / TOKEN_VALIDATION_FILENAME, TOKEN_VALIDATION_TTL)
+    
     if HIKERAPI_TOKEN == "<YOUR_TOKEN_HERE>" or not HIKERAPI_TOKEN:
-        HIKERAPI_TOKEN = prompt_for_token()
+        if not args.interactive:
+            print_error("No HikerAPI token: set HIKERAPI_TOKEN (config.py or environment) or use --token-file")
+            sys.exit(1)
+        set_option('HIKERAPI_TOKEN', prompt_for_token())
         if not HIKERAPI_TOKEN:
             print_error("Cannot proceed without valid token")
             sys.exit(1)
-    else:
+    elif not args.skip_token_check:
         # Validate configured token
-        is_valid, error_msg = validate_token_with_api(HIKERAPI_TOKEN)
+        is_valid, error_msg = validate_token_with_api(HIKERAPI_TOKEN, validation_cache)
         if not is_valid:
             print_error(f"Configured token is invalid: {error_msg}")
-            HIKERAPI_TOKEN = prompt_for_token()
+            if not args.interactive:
+                sys.exit(1)
+            set_option('HIKERAPI_TOKEN', prompt_for_token())
             if not HIKERAPI_TOKEN:
                 sys.exit(1)
     
+    # Additional tokens: invalid ones are left out of the pool
+    tokens = [HIKERAPI_TOKEN]
+    for i, token in enumerate(HIKERAPI_TOKENS, 2):
+        if token in tokens:
+            continue
+        is_valid, error_msg = (True, None) if args.skip_token_check else validate_token_with_api(token, validation_cache)
+        if is_valid:
+            tokens.append(token)
+        else:
+            print_warning(f"Skipping token {i}: {error_msg}")
+    
     # Validate other configuration
     if not validate_config():
         print_error("Please fix configuration errors in config.py")
         sys.exit(1)
     
-    # ... rest of main() stays the same
-    
     # Get URLs
     print_info("Loading URLs...")
     
-    # Check if post_urls.txt or post_urls.py exists
-    if Path("post_urls.txt").exists():
+    queue = None
+    if args.queue:
+        # Queue worker: posts are leased from the shared queue instead
+        queue = WorkQueue(args.queue, QUEUE_VISIBILITY_TIMEOUT, QUEUE_MAX_ATTEMPTS)
+        worker = default_worker_id()
+        counts = queue.counts()
+        urls = []
+        print_success(f"Worker {worker}: {counts['pending']} posts pending in {args.queue}")
+    elif args.input:
+        urls = []
+        for path in args.input:
+            loader = load_urls_from_python_file if path.endswith('.py') else load_urls_from_file
+            urls.extend(loader(path))
+        print_success(f"Loaded {len(urls)} URLs from {', '.join(args.input)}")
+    elif Path("post_urls.txt").exists():
         urls = load_urls_from_file("post_urls.txt")
         print_success(f"Loaded {len(urls)} URLs from post_urls.txt")
     elif Path("post_urls.py").exists():
         urls = load_urls_from_python_file("post_urls.py")
         print_success(f"Loaded {len(urls)} URLs from post_urls.py")
-    else:
+    elif args.interactive:
         urls = ask_for_urls()
+    else:
+        print_error("No URLs: pass --input FILE or create post_urls.txt")
+        sys.exit(1)
     
-    if not urls:
+    if not urls and not queue:
         print_error("No URLs to process")
         sys.exit(1)
     
+    # URL variants of the same post count once; posts scraped by a previous run are skipped
+    # (--incremental re-scrapes known posts on purpose)
+    index = ScrapedIndex(Path(OUTPUT_DIRECTORY) / SCRAPED_INDEX_FILENAME)
+    if not queue:
+        skip_scraped = SKIP_SCRAPED_POSTS and not args.rescrape and not args.incremental
+        urls, duplicates, scraped = dedupe_urls(urls, index if skip_scraped else None)
+        if duplicates:
+            print_info(f"Skipping {duplicates} duplicate URLs (same post)")
+        if scraped:
+            print_info(f"Skipping {scraped} posts already scraped by a previous run (--rescrape to include them)")
+        # --resume still replays the journal: its posts are in the index already
+        if not urls and not args.resume:
+            print_success("Nothing to do: every post was already scraped")
+            index.close()
+            http_pool.close()
+            return
+    
+    total_urls = len(urls) if not queue else counts['pending'] + counts['leased']
+    
+    # Streaming output: rows are written as each post finishes (none for a dry run)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    writer = None
+    if not args.plan_only:
+        try:
+            writer = open_writer(OUTPUT_FORMAT, OUTPUT_DIRECTORY, OUTPUT_FILENAME, timestamp)
+        except ImportError as e:
+            print_error(str(e))
+            sys.exit(1)
+        output_file = writer.path
+    
+    # Run journal: every completed post is checkpointed to disk
+    # Queue workers keep their journal next to the queue: it is their partial output for --merge
+    if queue:
+        journal = RunJournal(queue.parts_dir / f"{worker}.jsonl", resume=True)
+    else:
+        # A dry run must not rotate the journal of an interrupted batch
+        journal = RunJournal(Path(OUTPUT_DIRECTORY) / JOURNAL_FILENAME, resume=args.resume or args.plan_only)
+    
+    if args.resume and not queue:
+        done = set()
+        for post_info, comments, likers in journal.entries():
+            if writer:
+                writer.write_post(post_info, comments, likers)
+            done.add(post_info['shortcode'])
+        
+        urls = [url for url in urls if extract_shortcode(url) not in done]
+        total_urls = len(urls) + len(done)
+        print_success(f"Resuming: {len(done)} posts already in journal, {len(urls)} remaining")
+    
+    def record_result(result):
+        post_info, comments, likers = result
+        if post_info:
+            journal.record(post_info, comments, likers)
+            index.add(post_info['shortcode'], post_info.get('post_url'))
+    
     # Display summary
     print()
     print_header("EXTRACTION SUMMARY")
-    print(f"Posts to process: {Colors.BOLD}{len(urls)}{Colors.RESET}")
-    print(f"Rate limiting: {DELAY_BETWEEN_REQUESTS[0]}-{DELAY_BETWEEN_REQUESTS[1]}s")
+    print(f"Posts to process: {Colors.BOLD}{total_urls if queue else len(urls)}{Colors.RESET}")
+    print(f"Rate limiting: {REQUESTS_PER_SECOND} req/s per token (adaptive {MIN_REQUESTS_PER_SECOND}-{MAX_REQUESTS_PER_SECOND})")
+    print(f"API tokens: {len(tokens)}")
+    print(f"Concurrent posts: {MAX_CONCURRENT_POSTS}")
+    if args.incremental:
+        print("Mode: incremental (new comments since previous run)")
+    if args.deadline:
+        print(f"Deadline: {format_duration(args.deadline)} "
+              f"(by {datetime.fromtimestamp(time.time() + args.deadline).strftime('%H:%M:%S')})")
     print(f"Start time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*70}\n")
     
-    # Initialize
-    cl = Client(token=HIKERAPI_TOKEN)
+    # Initialize: one client and rate limiter per token, calls go to the least-loaded token
+    def new_limiter():
+        return AdaptiveRateLimiter(
+            REQUESTS_PER_SECOND, MIN_REQUESTS_PER_SECOND, MAX_REQUESTS_PER_SECOND,
+            burst=RATE_LIMIT_BURST,
+            decrease_factor=RATE_DECREASE_FACTOR,
+            increase_step=RATE_INCREASE_STEP,
+            recovery_successes=RATE_RECOVERY_SUCCESSES
+        )
+    
+    # Every API call is timed per endpoint, below the rate limiter (network time only)
+    metrics = RunMetrics()
+    
+    # Calls time out after API_TIMEOUT(S); with hedging, slow calls are duplicated at their p95
+    hedging = HedgePolicy(metrics.p95, HEDGE_BUDGET if HEDGE_ENABLED else 0, HEDGE_MIN_SAMPLES)
+    metrics.hedging = hedging
+    call_workers = 2 * MAX_CONCURRENT_POSTS * max(1, REPLY_WORKERS) + 2
+    timeouts = [API_TIMEOUT, *API_TIMEOUTS.values()]
+    http_timeout = None if None in timeouts else max(timeouts)
     
-    # Data collectors
-    all_posts_info = []
-    all_comments = []
-    all_likers = []
+    def new_client(token, token_limiter):
+        client = HedgedClient(
+            CheckedClient(Client(token=token, timeout=http_timeout), status=last_http_status),
+            API_TIMEOUT, API_TIMEOUTS,
+            policy=hedging, acquire=token_limiter.acquire, max_workers=call_workers
+        )
+        return InstrumentedClient(client, metrics)
+    
+    limiter = TokenPool(
+        tokens, new_client, new_limiter,
+        cooldowns=TOKEN_COOLDOWN, max_cooldown=TOKEN_MAX_COOLDOWN,
+        rate_limit_strikes=TOKEN_RATE_LIMIT_STRIKES
+    )
+    metrics.limiter = limiter
+    cl = PooledClient(limiter)
+    
+    # Transient errors and rate limits are retried above the pool, so a retry can use another token
+    retrying = RetryingClient(
+        cl, RetryPolicy(RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY),
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT,
+        sleep=metrics.sleep
+    )
+    cl = retrying
+    
+    # Cache sits in front of the rate limiter: cache hits cost no API call and no wait
+    cache = None
+    if CACHE_ENABLED:
+        cache = ResponseCache(
+            Path(OUTPUT_DIRECTORY) / CACHE_FILENAME,
+            ttls=CACHE_TTL,
+            max_bytes=CACHE_MAX_MB * 1024 * 1024
+        )
+        cl = CachedClient(cl, cache, API_ENDPOINTS)
+        metrics.cache = cache
+    
+    if args.trace:
+        tracing.enable(Path(OUTPUT_DIRECTORY) / TRACE_FILENAME)
+    
+    # The deadline budget covers the planning pre-pass too
+    budget = None
+    if args.deadline:
+        budget = DeadlineBudget(
+            args.deadline, limiter, safety_margin=DEADLINE_SAFETY_MARGIN,
+            comments_per_call=PLAN_COMMENTS_PER_CALL, reply_thread_ratio=PLAN_REPLY_THREAD_RATIO,
+            min_comments=DEADLINE_MIN_COMMENTS
+        )
+    
+    # Planning pre-pass: media info of every post, then order by estimated cost
+    prefetched = {}
+    if (args.plan or args.plan_only or budget) and not queue:
+        policy = args.policy or PLAN_POLICY
+        with tqdm(total=len(urls), desc=f"{Colors.CYAN}Planning{Colors.RESET}", unit="post") as pbar:
+            with tracing.span("plan", "phase", posts=len(urls)):
+                plans = build_plan(
+                    urls, lambda url: get_post_info(cl, url, pbar), extract_shortcode,
+                    workers=MAX_CONCURRENT_POSTS, pbar=pbar,
+                    max_comments=MAX_COMMENTS, max_likers=MAX_LIKERS,
+                    comments_per_call=PLAN_COMMENTS_PER_CALL, reply_thread_ratio=PLAN_REPLY_THREAD_RATIO,
+                    likers_per_call=PLAN_LIKERS_PER_CALL
+                )
+        plans = order_plans(plans, policy)
+        latency = metrics.percentiles('media_by_code_v1')['p50']
+        print_plan(plans, policy, limiter.current_rate, MAX_CONCURRENT_POSTS, latency=latency)
+        
+        if budget:
+            calls = sum(plan.total_calls - 1 for plan in plans if plan.post_info)
+            if project_runtime(calls, limiter.current_rate, MAX_CONCURRENT_POSTS, latency) > budget.remaining():
+                print_warning(f"Full depth does not fit in the {format_duration(args.deadline)} deadline: "
+                              f"comments per post will be capped")
+        
+        if args.plan_only:
+            journal.close()
+            index.close()
+            if cache:
+                cache.close()
+            http_pool.close()
+            tracing.disable()
+            return
+        
+        urls = [plan.url for plan in plans]
+        prefetched = {plan.url: plan.media for plan in plans if plan.media}
+    
+    exporter = None
+    if METRICS_ENABLED:
+        exporter = MetricsExporter(metrics, Path(OUTPUT_DIRECTORY) / METRICS_FILENAME, METRICS_EXPORT_INTERVAL).start()
+    
+    # Incremental mode: per-post comment watermarks from previous runs
+    state = None
+    if args.incremental:
+        state = IncrementalState(Path(OUTPUT_DIRECTORY) / INCREMENTAL_STATE_FILENAME)
+    
+    def tokens_rejected(pbar):
+        """True (and reported) once every token was rejected: the remaining posts would fail the same way"""
+        if not limiter.all_rejected():
+            return False
+        pbar.write(f"{Colors.RED}[ERROR]{Colors.RESET} Every API token was rejected (401/403), stopping: "
+                   f"check HIKERAPI_TOKEN and HIKERAPI_TOKENS in config.py")
+        return True
     
     # Progress bar
-    with tqdm(total=len(urls), desc=f"{Colors.CYAN}Progress{Colors.RESET}", unit="post") as pbar:
-        for i, url in enumerate(urls):
-            try:
-                # Process post
-                post_info, comments, likers = process_single_post(cl, url, pbar)
-                
-                if post_info:
-                    all_posts_info.append(post_info)
-                    all_comments.extend(comments)
-                    all_likers.extend(likers)
-                
-                pbar.update(1)
-                
-                # Delay between posts (except last)
-                if i < len(urls) - 1:
-                    delay = random.uniform(*DELAY_BETWEEN_POSTS)
-                    pbar.set_description(f"{Colors.YELLOW}Pause ({delay:.1f}s){Colors.RESET}")
-                    time.sleep(delay)
+    with tqdm(total=total_urls if queue else len(urls), desc=f"{Colors.CYAN}Progress{Colors.RESET}", unit="post") as pbar:
+        if budget:
+            # Phased run: comments for every post, then likers, each post written once complete
+            results = process_posts_with_deadline(
+                cl, plans, budget, MAX_CONCURRENT_POSTS, pbar, limiter, state=state
+            )
+            for result in results:
+                record_result(result)
+                writer.write_post(*result)
+                if tokens_rejected(pbar):
+                    break
+        elif queue:
+            # Posts arrive in completion order: the merge step restores queue order
+            results = process_queue(
+                cl, queue, worker, MAX_CONCURRENT_POSTS, pbar, limiter,
+                on_complete=record_result, state=state, metrics=metrics
+            )
+            for result in results:
+                if result and result[0]:
+                    writer.write_post(*result)
+                if tokens_rejected(pbar):
+                    break
+        elif MAX_CONCURRENT_POSTS > 1:
+            results = process_posts_concurrently(
+                cl, urls, MAX_CONCURRENT_POSTS, pbar, limiter,
+                on_complete=record_result, state=state, prefetched=prefetched
+            )
+            
+            # Results arrive in URL order so output matches a sequential run
+            for result in results:
+                if result and result[0]:
+                    writer.write_post(*result)
+                if tokens_rejected(pbar):
+                    break
+        else:
+            for url in urls:
+                try:
+                    # Process post
+                    post_info, comments, likers = process_single_post(cl, url, pbar, state, prefetched.get(url))
+                    
+                    if post_info:
+                        record_result((post_info, comments, likers))
+                        writer.write_post(post_info, comments, likers)
+                    
+                    pbar.update(1)
+                    show_rate(pbar, limiter)
+                    if tokens_rejected(pbar):
+                        break
                 
-            except KeyboardInterrupt:
-                pbar.write(f"\n{Colors.YELLOW}[INTERRUPTED]{Colors.RESET} Manual stop (Ctrl+C)")
-                break
-            except Exception as e:
-                pbar.write(f"{Colors.RED}[ERROR]{Colors.RESET} Critical error on {url}: {e}")
-                time.sleep(DELAY_AFTER_ERROR)
-                pbar.update(1)
+                except KeyboardInterrupt:
+                    pbar.write(f"\n{Colors.YELLOW}[INTERRUPTED]{Colors.RESET} Manual stop (Ctrl+C)")
+                    break
+                except Exception as e:
+                    # API errors were already retried with backoff: move on without sleeping
+                    pbar.write(f"{Colors.RED}[ERROR]{Colors.RESET} Critical error on {url}: {e}")
+                    pbar.update(1)
+    
+    journal.close()
+    index.close()
+    writer.close()
+    if cache:
+        cache.close()
+    if state:
+        state.close()
+    if queue:
+        counts = queue.counts()
+        queue.close()
+    http_pool.close()
+    trace = tracing.disable()
+    if exporter:
+        exporter.stop()
+        metrics.write_summary(Path(OUTPUT_DIRECTORY) / METRICS_SUMMARY_FILENAME)
     
-    # Save results
     print()
-    output_file = save_results(all_posts_info, all_comments, all_likers, OUTPUT_DIRECTORY, OUTPUT_FILENAME)
+    print_success(f"File saved: {output_file}")
+    print(f"  Total rows: {writer.rows:,}")
     
     # Final summary
     print()
@@ -648,11 +1361,30 @@ def main():
     print(f"End time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print()
     print(f"{Colors.BOLD}Results:{Colors.RESET}")
-    print(f"  Posts processed: {len(all_posts_info)}/{len(urls)}")
-    print(f"  Total comments: {len(all_comments)}")
-    print(f"  Total likes: {len(all_likers)}")
-    if output_file:
-        print(f"  Output file: {Colors.GREEN}{output_file}{Colors.RESET}")
+    print(f"  Posts processed: {writer.posts}/{total_urls}")
+    print(f"  Total comments: {writer.comments}")
+    print(f"  Total likes: {writer.likers}")
+    print(f"  API requests: {limiter.total_requests} ({limiter.total_rate_limits} rate-limited)")
+    if HEDGE_ENABLED or hedging.timeouts:
+        print(f"  Hedged calls: {hedging.hedges} ({hedging.hedge_wins} answered first), timeouts: {hedging.timeouts}")
+    circuits = sum(breaker.times_opened for breaker in retrying.breakers.values())
+    print(f"  Retries: {retrying.retries} ({retrying.recovered} calls recovered, {retrying.exhausted} gave up, "
+          f"circuit opened {circuits} times)")
+    print(f"  Final rate: {limiter.current_rate:.2f} req/s ({limiter.healthy_count()}/{len(limiter)} tokens in rotation)")
+    if cache:
+        print(f"  Cache: {cache.hits} hits, {cache.misses} misses")
+    print(f"  Output file: {Colors.GREEN}{output_file}{Colors.RESET}")
+    print(f"  Journal: {journal.path}")
+    if trace:
+        print(f"  Trace: {trace.path} ({trace.events:,} events, open in https://ui.perfetto.dev)")
+    if exporter:
+        summary = metrics.summary()
+        sleep_total = sum(summary['sleep_seconds'].values())
+        print(f"  Time: {summary['network_seconds']:.1f}s on API calls, {sleep_total:.1f}s sleeping (all workers)")
+        print(f"  Metrics: {exporter.path}, {Path(OUTPUT_DIRECTORY) / METRICS_SUMMARY_FILENAME}")
+    if queue:
+        print(f"  Queue: {counts['pending']} pending, {counts['leased']} leased, "
+              f"{counts['done']} done, {counts['failed']} failed")
     print(f"{'='*70}")
 
 
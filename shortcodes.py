@@ -0,0 +1,120 @@
+"""
+Shortcodes
+Canonical shortcode of every Instagram post URL variant, and a persistent index
+of the shortcodes already scraped so later runs skip them before any API call
+"""
+
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+# Path segments that introduce a post shortcode (/p/, /reel/, /reels/, /tv/)
+_POST_PATH = re.compile(r'/(?:p|reels?|tv)/([A-Za-z0-9_-]+)')
+
+# A bare shortcode pasted instead of a URL
+_BARE_SHORTCODE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def canonical_shortcode(url):
+    """
+    Shortcode of an Instagram post URL, or None if it is not one
+
+    Accepts /p/, /reel/, /reels/ and /tv/ links, with or without a username
+    prefix, scheme, www., query string (?igsh=, ?utm_source=) or fragment,
+    and bare shortcodes.
+    """
+    url = url.strip()
+    if _BARE_SHORTCODE.match(url):
+        return url
+
+    if '://' not in url:
+        url = f"https://{url}"
+    parts = urlsplit(url)
+    if not parts.hostname or not (parts.hostname == "instagram.com" or parts.hostname.endswith(".instagram.com")):
+        return None
+
+    match = _POST_PATH.search(parts.path)
+    return match.group(1) if match else None
+
+
+def canonical_url(shortcode):
+    """The one URL used for a post everywhere in the output"""
+    return f"https://www.instagram.com/p/{shortcode}/"
+
+
+class ScrapedIndex:
+    """
+    SQLite index of the posts scraped by every previous run (shortcode -> last scrape time)
+    Shared by all workers; a post is added once it has been written to the output
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS scraped (
+                shortcode TEXT PRIMARY KEY,
+                url TEXT,
+                scraped_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM scraped").fetchone()[0]
+
+    def scraped_at(self, shortcode):
+        """Unix time of the last scrape of a post (None if never scraped)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT scraped_at FROM scraped WHERE shortcode = ?", (shortcode,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def __contains__(self, shortcode):
+        return self.scraped_at(shortcode) is not None
+
+    def add(self, shortcode, url=None):
+        """Record that a post was scraped now"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO scraped VALUES (?, ?, ?)", (shortcode, url, time.time())
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def dedupe_urls(urls, index=None):
+    """
+    Keep the first URL of every post, dropping variants of the same shortcode
+    and (with an index) posts scraped by a previous run
+
+    Returns (urls, duplicates, already_scraped). URLs that are not post links
+    are kept as they are, so the scraper can report them.
+    """
+    seen = set()
+    kept = []
+    duplicates = already_scraped = 0
+
+    for url in urls:
+        shortcode = canonical_shortcode(url) or url
+        if shortcode in seen:
+            duplicates += 1
+            continue
+        seen.add(shortcode)
+
+        if index is not None and shortcode in index:
+            already_scraped += 1
+            continue
+        kept.append(url)
+
+    return kept, duplicates, already_scraped
@@ -0,0 +1,251 @@
+"""
+HikerAPI Token Pool
+Spread API calls over several access keys, each with its own rate budget and health state
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import tracing
+from api_errors import classify_error, AUTH, FORBIDDEN, RATE_LIMIT
+
+# Errors that take a token out of rotation
+ROTATION_ERRORS = (AUTH, FORBIDDEN, RATE_LIMIT)
+
+# Errors no cooldown is expected to fix (revoked or invalid access key)
+REJECTION_ERRORS = (AUTH, FORBIDDEN)
+
+
+class TokensRejectedError(Exception):
+    """Raised instead of waiting when every token is out of rotation after a 401/403"""
+
+
+class TokenSlot:
+    """One access key: its client, rate limiter and health state"""
+
+    def __init__(self, label, client, limiter):
+        self.label = label
+        self.client = client
+        self.limiter = limiter
+        self.waiting = 0            # calls routed here and not yet sent
+        self.disabled_until = 0.0   # monotonic time the token returns to rotation
+        self.strikes = 0            # consecutive rotation errors
+        self.last_error = None
+        self.total_errors = 0
+
+    def is_healthy(self, now):
+        return now >= self.disabled_until
+
+
+class TokenPool:
+    """
+    Route each call to the least-loaded healthy token
+
+    A token that answers 401/403 is taken out of rotation for the cooldown of
+    its error class, doubled on each consecutive failure up to max_cooldown.
+    When every token is benched that way, calls fail with TokensRejectedError
+    instead of waiting out the cooldown.
+    A 429 only slows the token's rate limiter down (AIMD) until rate_limit_strikes
+    of them come in a row; it never benches the last token in rotation.
+    Exposes the same counters as AdaptiveRateLimiter, summed over all tokens,
+    so it can be used wherever a single limiter is reported.
+    """
+
+    def __init__(self, tokens, client_factory, limiter_factory, cooldowns, max_cooldown=3600, rate_limit_strikes=3):
+        self._lock = threading.Lock()
+        self.slots = []
+        for i, token in enumerate(tokens, 1):
+            # client_factory(token, limiter): the client may use its token's limiter (hedged calls)
+            limiter = limiter_factory()
+            self.slots.append(TokenSlot(f"token {i}", client_factory(token, limiter), limiter))
+        self.cooldowns = cooldowns
+        self.max_cooldown = max_cooldown
+        self.rate_limit_strikes = rate_limit_strikes
+        self.total_cooldown_wait = 0.0
+
+    def __len__(self):
+        return len(self.slots)
+
+    # Aggregated limiter counters
+
+    @property
+    def current_rate(self):
+        """Combined rate of the tokens currently in rotation (requests per second)"""
+        now = time.monotonic()
+        return sum(slot.limiter.current_rate for slot in self.slots if slot.is_healthy(now))
+
+    @property
+    def total_requests(self):
+        return sum(slot.limiter.total_requests for slot in self.slots)
+
+    @property
+    def total_rate_limits(self):
+        return sum(slot.limiter.total_rate_limits for slot in self.slots)
+
+    @property
+    def total_wait(self):
+        return sum(slot.limiter.total_wait for slot in self.slots)
+
+    def healthy_count(self):
+        now = time.monotonic()
+        return sum(1 for slot in self.slots if slot.is_healthy(now))
+
+    def all_rejected(self, slots=None):
+        """True when every token (of `slots`) is out of rotation after a 401/403"""
+        now = time.monotonic()
+        slots = self.slots if slots is None else slots
+        return bool(slots) and all(
+            not slot.is_healthy(now) and slot.last_error in REJECTION_ERRORS for slot in slots
+        )
+
+    # Routing
+
+    def checkout(self, exclude=()):
+        """
+        Pick the healthy token with the shortest expected wait, skipping `exclude`
+        Blocks while every token is cooling down; returns None when the only
+        healthy tokens left are in `exclude`. Raises TokensRejectedError instead
+        of waiting when every token was benched by a 401/403.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                candidates = [slot for slot in self.slots if slot not in exclude]
+                healthy = [slot for slot in candidates if slot.is_healthy(now)]
+
+                if healthy:
+                    slot = min(
+                        healthy,
+                        key=lambda s: s.limiter.wait_time() + s.waiting / s.limiter.current_rate
+                    )
+                    slot.waiting += 1
+                    break
+                if exclude or not candidates:
+                    return None
+                if self.all_rejected(candidates):
+                    raise TokensRejectedError(
+                        "Every API token was rejected (401/403): check HIKERAPI_TOKEN and HIKERAPI_TOKENS"
+                    )
+                delay = min(slot.disabled_until for slot in candidates) - now
+
+            delay = max(delay, 0.1)
+            time.sleep(delay)
+            tracing.record_wait("token cooldown", delay)
+            with self._lock:
+                self.total_cooldown_wait += delay
+
+        try:
+            slot.limiter.acquire()
+        finally:
+            with self._lock:
+                slot.waiting -= 1
+        return slot
+
+    def report(self, slot, error):
+        """Record the outcome of a call on `slot` (error=None for success), returns the error class"""
+        slot.limiter.report(error)
+
+        with self._lock:
+            if error is None:
+                slot.strikes = 0
+                return None
+
+            error_class = classify_error(error)
+            slot.total_errors += 1
+            if error_class not in ROTATION_ERRORS:
+                return error_class
+            
+            slot.strikes += 1
+            slot.last_error = error_class
+            doublings = slot.strikes - 1
+            if error_class == RATE_LIMIT:
+                if slot.strikes < self.rate_limit_strikes or not any(
+                    other.is_healthy(time.monotonic()) for other in self.slots if other is not slot
+                ):
+                    return error_class
+                doublings = slot.strikes - self.rate_limit_strikes
+            
+            cooldown = min(self.max_cooldown, self.cooldowns[error_class] * 2 ** doublings)
+            slot.disabled_until = time.monotonic() + cooldown
+            return error_class
+
+
+class TokenValidationCache:
+    """
+    Successful token validations with a time to live, so restarts skip the test call
+    Tokens are stored as SHA-256 hashes; failed validations are never cached.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = Path(path)
+        self.ttl = ttl
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def age(self, token):
+        """Seconds since the token was last validated, None if unknown or expired"""
+        checked_at = self._entries.get(self._key(token))
+        if checked_at is None:
+            return None
+        age = time.time() - checked_at
+        return age if age < self.ttl else None
+
+    def store(self, token):
+        self._entries[self._key(token)] = time.time()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp, self.path)
+
+
+class PooledClient:
+    """
+    Client facade over a TokenPool
+
+    A call that fails with an error taking its token out of rotation is retried
+    once on each other healthy token before the error is raised.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def __getattr__(self, name):
+        attr = getattr(self.pool.slots[0].client, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            tried = []
+            last_error = None
+            while True:
+                slot = self.pool.checkout(exclude=tried)
+                if slot is None:
+                    if last_error is None:
+                        raise RuntimeError(f"No API token available for {name}")
+                    raise last_error
+
+                try:
+                    result = getattr(slot.client, name)(*args, **kwargs)
+                except Exception as e:
+                    if self.pool.report(slot, e) not in ROTATION_ERRORS:
+                        raise
+                    tried.append(slot)
+                    last_error = e
+                    continue
+
+                self.pool.report(slot, None)
+                return result
+
+        return call
@@ -0,0 +1,130 @@
+"""
+Run Tracing
+Timeline of posts, phases, API calls and sleeps in the Chrome Trace Event format
+(open the file in chrome://tracing or https://ui.perfetto.dev)
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+_recorder = None
+
+
+class TraceRecorder:
+    """
+    Streams trace events to a JSON array file as they complete
+
+    The array is closed by close(); an interrupted run leaves it open, which
+    the trace viewers still accept.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+        self._threads = set()
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write('[\n')
+        self.events = 0
+
+    def now(self):
+        """Microseconds since the trace started"""
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def _write(self, event):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(line + ',\n')
+                self.events += 1
+
+    def _thread_id(self):
+        thread = threading.current_thread()
+        tid = thread.ident
+        if tid not in self._threads:
+            self._threads.add(tid)
+            self._write({'ph': 'M', 'name': 'thread_name', 'pid': self._pid, 'tid': tid,
+                         'args': {'name': thread.name}})
+        return tid
+
+    def complete(self, name, category, start, end, args=None):
+        """Record a span from start to end (microseconds from now())"""
+        event = {'ph': 'X', 'name': name, 'cat': category, 'ts': round(start, 1),
+                 'dur': round(end - start, 1), 'pid': self._pid, 'tid': self._thread_id()}
+        if args:
+            event['args'] = args
+        self._write(event)
+
+    def instant(self, name, category, args=None):
+        event = {'ph': 'i', 's': 't', 'name': name, 'cat': category, 'ts': round(self.now(), 1),
+                 'pid': self._pid, 'tid': self._thread_id()}
+        if args:
+            event['args'] = args
+        self._write(event)
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(json.dumps({'ph': 'M', 'name': 'process_name', 'pid': self._pid,
+                                         'args': {'name': 'scraper'}}) + '\n]\n')
+            self._file.close()
+
+
+# ============================================
+# MODULE API (no-ops while tracing is off)
+# ============================================
+
+def enable(path):
+    """Start recording the run to path, returns the recorder"""
+    global _recorder
+    _recorder = TraceRecorder(path)
+    return _recorder
+
+
+def disable():
+    """Stop recording and close the trace file"""
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder:
+        recorder.close()
+    return recorder
+
+
+def is_enabled():
+    return _recorder is not None
+
+
+@contextmanager
+def span(name, category, **args):
+    """Record the enclosed block as a span on the current thread"""
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+
+    start = recorder.now()
+    try:
+        yield
+    finally:
+        recorder.complete(name, category, start, recorder.now(), args)
+
+
+def record_wait(name, seconds, **args):
+    """Record a wait of `seconds` that just ended on the current thread"""
+    recorder = _recorder
+    if recorder is not None and seconds > 0:
+        end = recorder.now()
+        recorder.complete(name, 'sleep', end - seconds * 1e6, end, args)
+
+
+def instant(name, category, **args):
+    recorder = _recorder
+    if recorder is not None:
+        recorder.instant(name, category, args)
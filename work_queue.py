@@ -0,0 +1,261 @@
+"""
+Shared Work Queue
+SQLite lease queue that shards a URL batch across several scraper hosts
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# Task states
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+def default_worker_id():
+    """Unique name of this scraper process: host-pid"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    """
+    Posts to scrape, leased to workers with a visibility timeout
+
+    A leased post is invisible to other workers until its lease expires;
+    workers extend their leases with heartbeat() while they are alive, so
+    the posts of a crashed host are re-issued once its leases run out.
+    A post is marked done only after the worker has written it to its
+    partial output (see parts_dir), so no completed post is lost.
+
+    The file can live on shared storage (NFS/SMB with working file locks):
+    it uses a rollback journal rather than WAL, which needs shared memory.
+    """
+
+    def __init__(self, path, visibility_timeout=600, max_attempts=3):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                shortcode TEXT NOT NULL UNIQUE,
+                url TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_id TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, lease_expires);
+        """)
+
+    @property
+    def parts_dir(self):
+        """Directory holding one partial output (journal) per worker"""
+        return self.path.with_name(f"{self.path.stem}_parts")
+
+    def _transaction(self, statements):
+        """Run statements(conn) in a write transaction, returns its result"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def enqueue(self, items):
+        """Add (shortcode, url) pairs, skipping shortcodes already queued; returns the number added"""
+        items = list(items)
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (shortcode, url, updated_at) VALUES (?, ?, ?)",
+                [(shortcode, url, time.time()) for shortcode, url in items]
+            )
+            return conn.total_changes - before
+
+        return self._transaction(insert)
+
+    def lease(self, worker, limit=1):
+        """
+        Lease up to `limit` pending posts (or posts whose lease expired)
+        An expired lease at max_attempts is marked FAILED instead: a post that
+        crashes its worker every time is not re-issued forever
+        Returns a list of (shortcode, url, lease_id)
+        """
+        def take(conn):
+            now = time.time()
+            conn.execute(
+                """UPDATE tasks SET status = 'failed', lease_id = NULL, lease_expires = NULL,
+                   last_error = 'lease expired ' || attempts || ' times', updated_at = ?
+                   WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?""",
+                (now, now, self.max_attempts)
+            )
+            rows = conn.execute(
+                """SELECT id, shortcode, url FROM tasks
+                   WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                   ORDER BY id LIMIT ?""",
+                (now, limit)
+            ).fetchall()
+
+            leased = []
+            for task_id, shortcode, url in rows:
+                lease_id = uuid.uuid4().hex
+                conn.execute(
+                    """UPDATE tasks SET status = 'leased', worker = ?, lease_id = ?,
+                       lease_expires = ?, attempts = attempts + 1, updated_at = ?
+                       WHERE id = ?""",
+                    (worker, lease_id, now + self.visibility_timeout, now, task_id)
+                )
+                leased.append((shortcode, url, lease_id))
+            return leased
+
+        return self._transaction(take)
+
+    def heartbeat(self, worker):
+        """Extend every lease held by worker, returns the number of leases extended"""
+        def extend(conn):
+            now = time.time()
+            return conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE status = 'leased' AND worker = ?",
+                (now + self.visibility_timeout, now, worker)
+            ).rowcount
+
+        return self._transaction(extend)
+
+    def complete(self, shortcode, worker):
+        """
+        Mark a post done by worker
+        Returns False if another worker already completed it (its lease had expired):
+        the merge step then ignores this worker's copy
+        """
+        def finish(conn):
+            return conn.execute(
+                """UPDATE tasks SET status = 'done', worker = ?, lease_id = NULL, updated_at = ?
+                   WHERE shortcode = ? AND status != 'done'""",
+                (worker, time.time(), shortcode)
+            ).rowcount == 1
+
+        return self._transaction(finish)
+
+    def release(self, shortcode, lease_id, error=None):
+        """Give a failed post back to the queue (FAILED after max_attempts)"""
+        def give_back(conn):
+            conn.execute(
+                """UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                   lease_id = NULL, lease_expires = NULL, last_error = ?, updated_at = ?
+                   WHERE shortcode = ? AND lease_id = ?""",
+                (self.max_attempts, error, time.time(), shortcode, lease_id)
+            )
+
+        self._transaction(give_back)
+
+    def counts(self):
+        """Number of posts per state"""
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall())
+        return {state: counts.get(state, 0) for state in (PENDING, LEASED, DONE, FAILED)}
+
+    def is_drained(self):
+        """True when no post is pending or leased"""
+        counts = self.counts()
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+
+    def completed(self):
+        """(shortcode, worker) of every done post, in queue order"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT shortcode, worker FROM tasks WHERE status = 'done' ORDER BY id"
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LeaseHeartbeat:
+    """Background thread extending a worker's leases every `interval` seconds"""
+
+    def __init__(self, queue, worker, interval):
+        self.queue = queue
+        self.worker = worker
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.queue.heartbeat(self.worker)
+            except sqlite3.Error:
+                # Shared storage hiccup: the next beat tries again before leases expire
+                pass
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def merge_parts(queue, writer):
+    """
+    Write every done post to writer, in queue order, from the partial output
+    of the worker that completed it. Returns the number of posts written.
+    """
+    owners = queue.completed()
+    wanted = {shortcode: worker for shortcode, worker in owners}
+
+    # Byte offset of the last journal line of each post in its owner's part
+    offsets = {}
+    for part in sorted(queue.parts_dir.glob("*.jsonl")):
+        worker = part.stem
+        with open(part, 'rb') as f:
+            position = 0
+            for line in f:
+                try:
+                    shortcode = json.loads(line)['shortcode']
+                except (ValueError, KeyError):
+                    # Line truncated by a crash: its post was never marked done
+                    shortcode = None
+                if wanted.get(shortcode) == worker:
+                    offsets[shortcode] = (part, position)
+                position += len(line)
+
+    written = 0
+    files = {}
+    try:
+        for shortcode, _ in owners:
+            if shortcode not in offsets:
+                continue
+            part, position = offsets[shortcode]
+            if part not in files:
+                files[part] = open(part, 'rb')
+            files[part].seek(position)
+            entry = json.loads(files[part].readline())
+            writer.write_post(entry['post'], entry['comments'], entry['likers'])
+            written += 1
+    finally:
+        for f in files.values():
+            f.close()
+
+    return written
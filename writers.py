@@ -0,0 +1,473 @@
+"""
+Output Writers
+Streaming sinks that write rows as each post finishes, with a fixed column schema
+"""
+
+import csv
+import sqlite3
+from datetime import datetime, timezone
+from itertools import islice, repeat
+from operator import itemgetter
+from pathlib import Path
+
+from records import RecordBuffer
+
+# Unified output schema (same columns and order as the end-of-run CSV)
+POST_COLUMNS = [
+    'original_url', 'post_url', 'shortcode', 'author', 'author_full_name', 'author_id',
+    'total_likes', 'total_comments', 'publication_date', 'media_type', 'caption',
+    'location', 'extraction_date'
+]
+
+OUTPUT_COLUMNS = POST_COLUMNS + [
+    'data_type', 'data_user', 'data_text', 'data_date',
+    'data_full_name', 'data_user_id', 'data_likes', 'data_is_verified',
+    'parent_user', 'comment_id', 'reply_count', 'data_is_private'
+]
+
+
+# ============================================
+# COLUMN-ORIENTED ASSEMBLY
+# ============================================
+
+# (output column, source key) per record type
+POST_FIELDS = [(column, column) for column in POST_COLUMNS] + [
+    ('data_user', 'author'), ('data_text', 'caption'), ('data_date', 'publication_date')
+]
+
+COMMENT_FIELDS = [
+    ('original_url', 'original_url'), ('shortcode', 'shortcode'), ('data_type', 'type'),
+    ('data_user', 'username'), ('data_full_name', 'full_name'), ('data_user_id', 'user_id'),
+    ('data_text', 'text'), ('data_date', 'date'), ('data_likes', 'likes'),
+    ('data_is_verified', 'is_verified'), ('parent_user', 'parent_user'),
+    ('comment_id', 'comment_id'), ('reply_count', 'reply_count')
+]
+
+LIKER_FIELDS = [
+    ('original_url', 'original_url'), ('shortcode', 'shortcode'),
+    ('data_user', 'username'), ('data_full_name', 'full_name'), ('data_user_id', 'user_id'),
+    ('data_is_verified', 'is_verified'), ('data_is_private', 'is_private')
+]
+
+
+# Rows transposed at once: bounds the memory of a post with many comments or likers
+ROW_CHUNK = 256
+
+
+def _columns(records, fields):
+    """
+    Transpose a list of dicts into {output column: tuple of values}
+    in a single itemgetter pass (no per-row dict is built)
+    """
+    if not records:
+        return {column: () for column, _ in fields}
+    
+    getter = itemgetter(*[key for _, key in fields])
+    return dict(zip([column for column, _ in fields], zip(*map(getter, records))))
+
+
+def _column_chunks(records, fields, size=ROW_CHUNK):
+    """
+    Yield ({output column: values}, row count) for every `size` records
+    Buffers are read column by column, lists of dicts through _columns
+    """
+    if isinstance(records, RecordBuffer):
+        for start, stop in records.iter_chunks(size):
+            yield {column: records.column(key, start, stop) for column, key in fields}, stop - start
+    else:
+        for start in range(0, len(records), size):
+            chunk = records[start:start + size]
+            yield _columns(chunk, fields), len(chunk)
+
+
+def _output_rows(columns, count, columns_order=OUTPUT_COLUMNS):
+    """Rows as tuples in output column order ('' for columns the record type lacks)"""
+    return zip(*[columns.get(column) or repeat('', count) for column in columns_order])
+
+
+def iter_post_rows(post_info, comments, likers, columns_order=OUTPUT_COLUMNS):
+    """Yield the unified rows of one post as tuples: post, comments/replies, likes"""
+    post = {column: (post_info.get(key, ''),) for column, key in POST_FIELDS}
+    post['data_type'] = ('POST',)
+    yield from _output_rows(post, 1, columns_order)
+    
+    for columns, count in _column_chunks(comments, COMMENT_FIELDS):
+        columns['data_type'] = [kind.upper() for kind in columns['data_type']]  # 'COMMENT' or 'REPLY'
+        yield from _output_rows(columns, count, columns_order)
+    
+    for columns, count in _column_chunks(likers, LIKER_FIELDS):
+        columns['data_type'] = repeat('LIKE', count)
+        yield from _output_rows(columns, count, columns_order)
+
+
+# ============================================
+# STREAMING CSV
+# ============================================
+
+class StreamingCSVWriter:
+    """
+    Append rows to a CSV file post by post
+    The header is written up front and the file is flushed after every post,
+    so it can be read while the run is still going.
+    """
+    
+    def __init__(self, path, columns=OUTPUT_COLUMNS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.columns = columns
+        
+        self.posts = 0
+        self.comments = 0
+        self.likers = 0
+        self.rows = 0
+        
+        self._file = open(self.path, 'w', newline='', encoding='utf-8-sig')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+        self._file.flush()
+    
+    def write_post(self, post_info, comments, likers):
+        """Write all rows of one post, built column by column, then flush"""
+        self._writer.writerows(iter_post_rows(post_info, comments, likers, self.columns))
+        self._file.flush()
+        
+        self.posts += 1
+        self.comments += len(comments)
+        self.likers += len(likers)
+        self.rows += 1 + len(comments) + len(likers)
+    
+    def close(self):
+        self._file.close()
+
+
+# ============================================
+# PARQUET DATASETS
+# ============================================
+
+def _to_int(value):
+    """int64 value, or None for missing/non-numeric ids and counts"""
+    if value is None or value == '' or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_timestamp(value):
+    """
+    Parse API dates (epoch seconds, ISO 8601 or '%Y-%m-%d %H:%M:%S') to datetime
+    Returns None when the value cannot be parsed
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc)
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+class ParquetDatasetWriter:
+    """
+    Write one Parquet dataset per record type (posts, comments, likes)
+    
+    Each dataset is hive-partitioned by shortcode: one file per post under
+    <dataset>/shortcode=<shortcode>/, so the output grows post by post and
+    `pyarrow.parquet.read_table(<dataset>)` returns shortcode as a dictionary column.
+    """
+    
+    def __init__(self, path, batch_size=10000):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)")
+        
+        self._pa = pa
+        self._pq = pq
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        
+        self.posts = 0
+        self.comments = 0
+        self.likers = 0
+        self.rows = 0
+        
+        dict_string = pa.dictionary(pa.int32(), pa.string())
+        timestamp = pa.timestamp('s')
+        timestamp_utc = pa.timestamp('s', tz='UTC')
+        
+        # shortcode is stored in the partition directory, not in the files
+        self.schemas = {
+            'posts': pa.schema([
+                ('original_url', pa.string()),
+                ('post_url', pa.string()),
+                ('author', dict_string),
+                ('author_full_name', pa.string()),
+                ('author_id', pa.int64()),
+                ('total_likes', pa.int64()),
+                ('total_comments', pa.int64()),
+                ('publication_date', timestamp_utc),
+                ('media_type', pa.int64()),
+                ('caption', pa.string()),
+                ('location', pa.string()),
+                ('extraction_date', timestamp),
+            ]),
+            'comments': pa.schema([
+                ('original_url', dict_string),
+                ('type', dict_string),
+                ('comment_id', pa.int64()),
+                ('parent_id', pa.int64()),
+                ('parent_user', dict_string),
+                ('username', dict_string),
+                ('full_name', pa.string()),
+                ('user_id', pa.int64()),
+                ('text', pa.string()),
+                ('date', timestamp),
+                ('likes', pa.int64()),
+                ('reply_count', pa.int64()),
+                ('is_verified', pa.bool_()),
+            ]),
+            'likes': pa.schema([
+                ('original_url', dict_string),
+                ('username', dict_string),
+                ('full_name', pa.string()),
+                ('user_id', pa.int64()),
+                ('is_verified', pa.bool_()),
+                ('is_private', pa.bool_()),
+            ]),
+        }
+        
+        # Value converters per column type
+        self._converters = {
+            pa.int64(): _to_int,
+            timestamp: lambda v: self._naive(_to_timestamp(v)),
+            timestamp_utc: lambda v: self._utc(_to_timestamp(v)),
+            pa.bool_(): lambda v: None if v is None or v == '' else bool(v),
+        }
+    
+    @staticmethod
+    def _naive(value):
+        return value.replace(tzinfo=None) if value and value.tzinfo else value
+    
+    @staticmethod
+    def _utc(value):
+        return value.replace(tzinfo=timezone.utc) if value and not value.tzinfo else value
+    
+    def _write_records(self, dataset, shortcode, records):
+        """Write records of one post as a single file, in batches of batch_size rows"""
+        pa = self._pa
+        schema = self.schemas[dataset]
+        converters = [self._converters.get(field.type, lambda v: v) for field in schema]
+        
+        records = iter(records)
+        batch = list(islice(records, self.batch_size))
+        if not batch:
+            return 0
+        
+        partition = self.path / dataset / f"shortcode={shortcode}"
+        partition.mkdir(parents=True, exist_ok=True)
+        
+        written = 0
+        with self._pq.ParquetWriter(partition / "part-0.parquet", schema) as writer:
+            while batch:
+                # Column-oriented build: one list per field
+                columns = [
+                    pa.array([convert(record.get(field.name)) for record in batch], type=field.type)
+                    if not pa.types.is_dictionary(field.type) else
+                    pa.array([record.get(field.name) for record in batch], type=pa.string()).dictionary_encode()
+                    for field, convert in zip(schema, converters)
+                ]
+                writer.write_batch(pa.record_batch(columns, schema=schema))
+                written += len(batch)
+                batch = list(islice(records, self.batch_size))
+        
+        return written
+    
+    def write_post(self, post_info, comments, likers):
+        """Write the post, its comments/replies and its likes to their datasets"""
+        shortcode = post_info['shortcode']
+        
+        self.rows += self._write_records('posts', shortcode, [post_info])
+        self.rows += self._write_records('comments', shortcode, comments)
+        self.rows += self._write_records('likes', shortcode, likers)
+        
+        self.posts += 1
+        self.comments += len(comments)
+        self.likers += len(likers)
+    
+    def close(self):
+        pass
+
+
+# ============================================
+# RELATIONAL STORE
+# ============================================
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id INTEGER PRIMARY KEY,
+    username TEXT,
+    full_name TEXT,
+    is_verified INTEGER,
+    is_private INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS posts (
+    shortcode TEXT PRIMARY KEY,
+    original_url TEXT,
+    post_url TEXT,
+    author_id INTEGER REFERENCES users(user_id),
+    total_likes INTEGER,
+    total_comments INTEGER,
+    publication_date TEXT,
+    media_type INTEGER,
+    caption TEXT,
+    location TEXT,
+    extraction_date TEXT
+);
+
+CREATE TABLE IF NOT EXISTS comments (
+    comment_id INTEGER PRIMARY KEY,
+    shortcode TEXT NOT NULL REFERENCES posts(shortcode),
+    parent_comment_id INTEGER REFERENCES comments(comment_id),
+    user_id INTEGER REFERENCES users(user_id),
+    text TEXT,
+    date TEXT,
+    likes INTEGER,
+    reply_count INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS likes (
+    shortcode TEXT NOT NULL REFERENCES posts(shortcode),
+    user_id INTEGER NOT NULL REFERENCES users(user_id),
+    PRIMARY KEY (shortcode, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_comments_shortcode ON comments(shortcode);
+CREATE INDEX IF NOT EXISTS idx_comments_user ON comments(user_id);
+CREATE INDEX IF NOT EXISTS idx_comments_parent ON comments(parent_comment_id);
+CREATE INDEX IF NOT EXISTS idx_likes_user ON likes(user_id);
+CREATE INDEX IF NOT EXISTS idx_posts_author ON posts(author_id);
+"""
+
+# Keep known names/flags when a later row does not carry them (e.g. comment users)
+UPSERT_USER = """
+INSERT INTO users (user_id, username, full_name, is_verified, is_private)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT(user_id) DO UPDATE SET
+    username = COALESCE(NULLIF(excluded.username, ''), users.username),
+    full_name = COALESCE(NULLIF(excluded.full_name, ''), users.full_name),
+    is_verified = COALESCE(excluded.is_verified, users.is_verified),
+    is_private = COALESCE(excluded.is_private, users.is_private)
+"""
+
+
+class SQLiteStore:
+    """
+    Normalized SQLite database: posts, comments (replies linked by parent_comment_id),
+    likes, and one deduplicated users table
+    
+    The database is kept across runs, so re-scraped posts update their rows and
+    questions spanning many posts are indexed queries.
+    """
+    
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self.posts = 0
+        self.comments = 0
+        self.likers = 0
+        self.rows = 0
+        
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+        self._conn.commit()
+    
+    def write_post(self, post_info, comments, likers):
+        """Insert one post with its comments, likes and users in a single transaction"""
+        shortcode = post_info['shortcode']
+        
+        users = [(
+            _to_int(post_info['author_id']), post_info['author'], post_info['author_full_name'], None, None
+        )]
+        users.extend(
+            (_to_int(c['user_id']), c['username'], c['full_name'], c['is_verified'], None)
+            for c in comments
+        )
+        users.extend(
+            (_to_int(l['user_id']), l['username'], l['full_name'], l['is_verified'], l['is_private'])
+            for l in likers
+        )
+        
+        with self._conn:
+            self._conn.executemany(UPSERT_USER, [user for user in users if user[0] is not None])
+            self._conn.execute(
+                "INSERT OR REPLACE INTO posts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (shortcode, post_info['original_url'], post_info['post_url'],
+                 _to_int(post_info['author_id']), _to_int(post_info['total_likes']),
+                 _to_int(post_info['total_comments']), str(post_info['publication_date']),
+                 _to_int(post_info['media_type']), post_info['caption'], post_info['location'],
+                 post_info['extraction_date'])
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO comments VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(_to_int(c['comment_id']), shortcode, _to_int(c.get('parent_id')),
+                  _to_int(c['user_id']), c['text'], c['date'], _to_int(c['likes']),
+                  _to_int(c['reply_count']))
+                 for c in comments if _to_int(c['comment_id']) is not None]
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO likes VALUES (?, ?)",
+                [(shortcode, _to_int(l['user_id'])) for l in likers if _to_int(l['user_id']) is not None]
+            )
+        
+        self.posts += 1
+        self.comments += len(comments)
+        self.likers += len(likers)
+        self.rows += 1 + len(comments) + len(likers)
+    
+    def engaged_with_all(self, shortcodes):
+        """Users who liked or commented on every one of the given posts"""
+        shortcodes = list(shortcodes)
+        placeholders = ", ".join("?" * len(shortcodes))
+        query = f"""
+            SELECT u.user_id, u.username
+            FROM users u
+            JOIN (
+                SELECT user_id, shortcode FROM likes WHERE shortcode IN ({placeholders})
+                UNION
+                SELECT user_id, shortcode FROM comments WHERE shortcode IN ({placeholders})
+            ) e ON e.user_id = u.user_id
+            GROUP BY u.user_id
+            HAVING COUNT(DISTINCT e.shortcode) = ?
+        """
+        return self._conn.execute(query, shortcodes + shortcodes + [len(shortcodes)]).fetchall()
+    
+    def close(self):
+        self._conn.close()
+
+
+def open_writer(output_format, output_dir, output_filename, timestamp):
+    """
+    Create the output writer for the configured format ("csv", "parquet" or "sqlite")
+    CSV writes <name>_<timestamp>.csv, Parquet writes the <name>_<timestamp>/ directory,
+    SQLite updates <name>.sqlite across runs
+    """
+    base = Path(output_filename).stem
+    
+    if output_format == "csv":
+        return StreamingCSVWriter(Path(output_dir) / f"{base}_{timestamp}.csv")
+    elif output_format == "parquet":
+        return ParquetDatasetWriter(Path(output_dir) / f"{base}_{timestamp}")
+    elif output_format == "sqlite":
+        return SQLiteStore(Path(output_dir) / f"{base}.sqlite")
+    else:
+        raise ValueError(f"Unknown output format: {output_format}")